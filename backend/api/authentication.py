@@ -0,0 +1,74 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """LRU-кэш токенов в памяти процесса.
+
+    Хранит токен вместе с пользователем не дольше ``TOKEN_CACHE_TTL``
+    секунд и не больше ``TOKEN_CACHE_MAX_ENTRIES`` записей. Сигналы
+    сбрасывают записи в текущем процессе; в остальных процессах запись
+    устаревает по TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            token, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def set(self, token):
+        with self._lock:
+            self._entries[token.key] = (
+                token, time.monotonic() + settings.TOKEN_CACHE_TTL)
+            self._entries.move_to_end(token.key)
+            while len(self._entries) > settings.TOKEN_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (token, _) in self._entries.items()
+                        if token.user_id == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication с кэшем токен → пользователь.
+
+    Повторный запрос с тем же токеном не обращается к базе. Каждый запрос
+    получает свою копию пользователя, чтобы изменения в одном запросе
+    не попадали в другие.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(token)
+        return copy.copy(token.user), token
@@ -0,0 +1,68 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+
+CATALOGUE_KEY = 'catalogue:{name}'
+
+
+def get_cache():
+    return caches[settings.CATALOGUE_CACHE_ALIAS]
+
+
+def get_entry(name, queryset, build):
+    """Версия и готовый JSON справочника — одна запись кеша на справочник.
+
+    Версия — хеш содержимого, поэтому ETag меняется только вместе
+    с данными. Количество строк и максимальный id читаются из базы при
+    каждом запросе: вставки и удаления, сделанные в других процессах,
+    пересобирают запись сразу. Правки строк в своём процессе сбрасывают
+    её сигналами, в других — подхватываются, когда запись истечёт через
+    ``CATALOGUE_CACHE_TIMEOUT`` секунд.
+    """
+    stats = tuple(queryset.order_by().aggregate(
+        count=Count('pk'), last=Max('pk')).values())
+    cache = get_cache()
+    key = CATALOGUE_KEY.format(name=name)
+    entry = cache.get(key)
+    if entry is None or entry[0] != stats:
+        content = JSONRenderer().render(build())
+        entry = (stats, md5(content, usedforsecurity=False).hexdigest(),
+                 content)
+        cache.set(key, entry, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return entry[1:]
+
+
+def invalidate(name):
+    get_cache().delete(CATALOGUE_KEY.format(name=name))
+
+
+class CatalogueCacheMixin:
+    """Отдаёт список справочника из кеша с ETag по версии справочника.
+
+    Кешируется только список без параметров запроса, остальные запросы
+    обрабатываются обычным образом.
+    """
+
+    catalogue_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        queryset = self.get_queryset()
+        version, content = get_entry(
+            self.catalogue_name, queryset,
+            lambda: self.get_serializer(queryset, many=True).data
+        )
+        etag = quote_etag(version)
+        not_modified = get_conditional_response(request, etag=etag)
+        if isinstance(not_modified, HttpResponseNotModified):
+            return not_modified
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,139 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Exists, Max, OuterRef, Subquery, Value
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from recipes.models import FavoritRecipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+# Таблицы, от которых зависят пользовательские флаги в карточке рецепта.
+USER_STATE_MODELS = (
+    ('favorites', FavoritRecipe, 'user'),
+    ('cart', ShoppingCart, 'user'),
+    ('follows', Follow, 'user'),
+)
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(
+        '|'.join(str(part) for part in parts).encode(),
+        usedforsecurity=False
+    ).hexdigest()
+    return quote_etag(digest)
+
+
+def get_user_state(user):
+    """Отпечаток избранного, корзины и подписок пользователя.
+
+    Идентификаторы растут монотонно, поэтому пара (количество,
+    максимальный id) меняется при любом добавлении или удалении.
+    """
+    if not user.is_authenticated:
+        return ()
+    annotations = {}
+    for name, model, field in USER_STATE_MODELS:
+        rows = model.objects.filter(
+            **{field: OuterRef('pk')}).order_by().values(field)
+        annotations[f'{name}_count'] = Subquery(
+            rows.annotate(value=Count('id')).values('value'))
+        annotations[f'{name}_max'] = Subquery(
+            rows.annotate(value=Max('id')).values('value'))
+    return tuple(
+        User.objects.filter(pk=user.pk).annotate(
+            **annotations).values_list(*annotations).get()
+    )
+
+
+def get_recipe_state(pk, user):
+    """Дата изменения рецепта и флаги пользователя одним запросом."""
+    queryset = Recipe.objects.annotate_for_user(user)
+    if user.is_authenticated:
+        queryset = queryset.annotate(author_is_subscribed=Exists(
+            Follow.objects.filter(user=user, following=OuterRef('author'))
+        ))
+    else:
+        queryset = queryset.annotate(author_is_subscribed=Value(False))
+    try:
+        return queryset.filter(pk=pk).values_list(
+            'updated_at', 'is_favorited', 'is_in_shopping_cart',
+            'author_is_subscribed', 'favorites_count'
+        ).first()
+    except (TypeError, ValueError, ValidationError):
+        return None
+
+
+class ConditionalRecipeMixin:
+    """Условные GET-запросы (ETag / Last-Modified) для рецептов.
+
+    Валидатор считается лёгким запросом до сериализации, и при совпадении
+    отдаётся 304. Для списка в ETag входят параметры запроса, id, даты
+    изменения и счётчики избранного рецептов текущей страницы, а также
+    общее количество (в режиме курсора — наличие следующей страницы);
+    ключи страницы выбираются тем же запросом, что и при обычной
+    выдаче, без агрегатов по всей выборке. Для карточки — дата
+    изменения рецепта и его счётчик избранного. В обоих случаях
+    учитываются флаги текущего пользователя. Last-Modified отдаётся
+    только анонимным пользователям для карточки: для них ответ
+    определяется датой изменения рецепта (счётчик избранного по нему
+    может отставать).
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = dict.fromkeys((
+            'id', 'updated_at', 'favorites_count',
+            *(field.lstrip('-') for field in self.keyset_ordering)))
+        keys = queryset.prefetch_related(None).values_list(
+            *fields, named=True)
+        page = self.paginate_queryset(keys)
+        if page is None:
+            page = list(keys)
+            state = None
+        else:
+            state = self.paginator.get_page_state()
+        etag = make_etag(
+            'list', request.user.pk, sorted(request.query_params.lists()),
+            state, [(row.id, row.updated_at, row.favorites_count)
+                    for row in page],
+            get_user_state(request.user)
+        )
+        return self.conditional_response(
+            etag, None, self.list_page, request, queryset, page)
+
+    def list_page(self, request, queryset, page):
+        """Выдача страницы, ключи которой уже выбраны для ETag."""
+        recipes = queryset.in_bulk([row.id for row in page])
+        serializer = self.get_serializer(
+            [recipes[row.id] for row in page if row.id in recipes],
+            many=True)
+        if self.paginator is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        state = get_recipe_state(kwargs[lookup], request.user)
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = make_etag('detail', request.user.pk, kwargs[lookup], *state)
+        last_modified = (
+            None if request.user.is_authenticated
+            else int(state[0].timestamp())
+        )
+        return self.conditional_response(
+            etag, last_modified, super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, etag, last_modified, view, request,
+                             *args, **kwargs):
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
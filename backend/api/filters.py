@@ -1,31 +1,54 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import (FilterSet,
                                            BooleanFilter,
+                                           CharFilter,
                                            ModelMultipleChoiceFilter)
 
-from recipes.models import Recipe, TagSlug
+from recipes import search
+from recipes.models import FavoritRecipe, Recipe, ShoppingCart, TagSlug
 
 
 class RecipeFilter(FilterSet):
-    """Фильтр по полю автор и тег."""
+    """Фильтр по автору, тегам, спискам пользователя и тексту.
+
+    Связи проверяются коррелированными подзапросами EXISTS, а не JOIN,
+    поэтому выборка не размножает строки и не требует DISTINCT.
+    """
     tags = ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=TagSlug.objects.all(),
-        conjoined=False
+        method='filter_tags'
     )
     is_in_shopping_cart = BooleanFilter(method='filter_is_in_shopping_cart')
     is_favorited = BooleanFilter(method='filter_is_favorited')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
+
+    def filter_search(self, queryset, name, value):
+        return search.search(queryset, value)
+
+    def filter_tags(self, queryset, name, value):
+        # Слаги уже разрешены в теги одним запросом при валидации формы.
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tagslug__in=[tag.pk for tag in value]
+        )))
 
     def filter_is_favorited(self, queryset, name, value):
-        if value and self.request.user.is_authenticated:
-            return queryset.filter(favorite_recipes__user=self.request.user)
-        return queryset
+        return self.filter_by_user_relation(queryset, FavoritRecipe, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_by_user_relation(queryset, ShoppingCart, value)
+
+    def filter_by_user_relation(self, queryset, model, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_carts__user=self.request.user)
+            return queryset.filter(Exists(model.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
@@ -1,31 +1,32 @@
 import csv
 
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 
-from recipes.models import Ingredient
 
+class Echo:
+    """Псевдобуфер: csv.writer пишет строку и сразу отдаёт её наружу."""
 
-def download(shopping_cart, ingredients, ingredients_amount):
-    """Подготовка и скачивание списка."""
-    cart = {}
-    for ingredient_set in shopping_cart:
-        if ingredient_set[ingredients] not in cart:
-            cart[
-                ingredient_set[ingredients]
-            ] = ingredient_set[ingredients_amount]
-        cart[
-            ingredient_set[ingredients]
-        ] = cart[
-            ingredient_set[ingredients]
-        ] + ingredient_set[ingredients_amount]
-    response = HttpResponse(
+    def write(self, value):
+        return value
+
+
+def download(ingredients):
+    """Потоковая выгрузка списка покупок в CSV.
+
+    Ожидает уже сгруппированные в БД строки с полями
+    ``name``, ``measurement_unit`` и ``total_amount``.
+    """
+    writer = csv.writer(Echo())
+    rows = (
+        writer.writerow(
+            [ingredient['name'], ingredient['total_amount'],
+             ingredient['measurement_unit']]
+        ) for ingredient in ingredients.iterator()
+    )
+    return StreamingHttpResponse(
+        rows,
         content_type="text/csv",
         headers={
             "Content-Disposition": 'attachment; filename="some.csv"'
         },
     )
-    writer = csv.writer(response)
-    for ing, amount in cart.items():
-        ingredient = Ingredient.objects.get(pk=ing)
-        writer.writerow([ingredient, amount, ingredient.measurement_unit])
-    return response
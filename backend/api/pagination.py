@@ -1,7 +1,126 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (LimitOffsetPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPaginationMixin:
+    """Необязательный режим пагинации по ключу (курсору).
+
+    Включается параметром ``?cursor=`` (пустое значение — первая
+    страница). Порядок задаётся атрибутом ``keyset_ordering`` вьюсета,
+    последнее поле должно быть уникальным. Следующая страница выбирается
+    условием по последней записи вместо OFFSET, общее количество
+    не считается. Без параметра работает исходная пагинация.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.cursor_query_param in request.query_params
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = view.keyset_ordering
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.model = queryset.model
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            queryset = queryset.filter(self.get_keyset_filter(cursor))
+        page_size = self.get_keyset_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_keyset_page_size(self, request):
+        return self.get_page_size(request)
+
+    def encode_cursor(self, obj):
+        values = [
+            self.model._meta.get_field(field).value_to_string(obj)
+            for field in self.fields
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                self.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
 
+    def get_keyset_filter(self, cursor):
+        """Условие «строго после курсора» для составного ключа.
 
-class RecipePagination(PageNumberPagination):
+        Кроме дизъюнкции по полям ключа добавляется отдельная граница
+        по первому полю (``<=`` / ``>=``): по ней индекс просматривается
+        с позиции курсора, а не с начала.
+        """
+        values = self.decode_cursor(cursor)
+        conditions = []
+        for position, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{self.fields[position]}__{lookup}':
+                             values[position]})
+            for previous in range(position):
+                condition &= Q(**{self.fields[previous]: values[previous]})
+            conditions.append(condition)
+        bound = 'lte' if self.ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{self.fields[0]}__{bound}': values[0]}) & reduce(
+            or_, conditions)
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
+class RecipePagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = settings.PAGE_SIZE
     page_size_query_param = "limit"
+
+    def get_page_state(self):
+        """От чего, кроме самих записей, зависят ссылки страницы."""
+        if self.keyset_mode:
+            return self.has_next
+        return self.page.paginator.count
+
+
+class SubscriptionPagination(KeysetPaginationMixin, LimitOffsetPagination):
+
+    def get_keyset_page_size(self, request):
+        return self.get_limit(request)
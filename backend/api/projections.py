@@ -0,0 +1,144 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch, prefetch_related_objects
+
+from recipes.models import IngredientsRecipe
+
+RECIPE_FRAGMENT_KEY = 'recipe_fragment:{base}:{pk}:{version}'
+
+
+class RecipeProjection:
+    """Быстрая замена RecipesListSerializer для чтения.
+
+    Собирает словари напрямую из рецептов, загруженных
+    ``Recipe.objects.with_related_for_user``, без полей DRF. Ключи,
+    их порядок и значения совпадают с RecipesListSerializer; интерфейс
+    (``instance``, ``many``, ``context``, ``data``) — как у сериализатора.
+    """
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(obj) for obj in self.instance]
+        return self.to_representation(self.instance)
+
+    def get_file_url(self, file):
+        if not file:
+            return None
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(file.url)
+        return file.url
+
+    def get_author(self, author):
+        return {
+            'id': author.id,
+            'email': author.email,
+            'username': author.username,
+            'avatar': self.get_file_url(author.avatar),
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': self.get_is_subscribed(author),
+        }
+
+    def get_is_subscribed(self, author):
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
+        request = self.context.get('request')
+        return bool(request and request.user.is_authenticated
+                    and author.following.filter(user=request.user).exists())
+
+    def to_representation(self, recipe):
+        return {
+            'id': recipe.id,
+            'tags': [
+                {'id': tag.id, 'name': tag.name, 'slug': tag.slug}
+                for tag in recipe.tags.all()
+            ],
+            'author': self.get_author(recipe.author),
+            'ingredients': [
+                {
+                    'id': row.ingredients.id,
+                    'name': row.ingredients.name,
+                    'measurement_unit': row.ingredients.measurement_unit,
+                    'amount': row.amount,
+                }
+                for row in recipe.ingredient_recipes.all()
+            ],
+            'is_favorited': bool(getattr(recipe, 'is_favorited', False)),
+            'is_in_shopping_cart': bool(
+                getattr(recipe, 'is_in_shopping_cart', False)),
+            'name': recipe.name,
+            'image': self.get_file_url(recipe.image),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'favorites_count': recipe.favorites_count,
+        }
+
+
+class CachedRecipeProjection(RecipeProjection):
+    """RecipeProjection с кэшем общих для всех пользователей фрагментов.
+
+    Фрагмент — представление рецепта без признаков текущего пользователя
+    и без счётчика избранного. Ключ включает дату изменения рецепта,
+    которую обновляют правки рецепта, его ингредиентов и тегов, а также
+    профиля автора, поэтому устаревший фрагмент не будет прочитан.
+    Признаки пользователя и счётчик берутся из аннотаций
+    ``Recipe.objects.with_user_flags``, посчитанных вместе со страницей.
+    """
+
+    @property
+    def data(self):
+        recipes = list(self.instance) if self.many else [self.instance]
+        fragments = self.get_fragments(recipes)
+        data = [self.overlay(fragments[recipe.pk], recipe)
+                for recipe in recipes]
+        return data if self.many else data[0]
+
+    def get_fragment_key(self, recipe):
+        request = self.context.get('request')
+        base_url = request.build_absolute_uri('/') if request else ''
+        return RECIPE_FRAGMENT_KEY.format(
+            base=md5(base_url.encode()).hexdigest()[:8],
+            pk=recipe.pk, version=recipe.updated_at.timestamp())
+
+    def get_fragments(self, recipes):
+        cache = caches[settings.RECIPE_FRAGMENT_CACHE_ALIAS]
+        keys = {recipe.pk: self.get_fragment_key(recipe)
+                for recipe in recipes}
+        cached = cache.get_many(keys.values())
+        fragments = {pk: cached[key] for pk, key in keys.items()
+                     if key in cached}
+        missing = [recipe for recipe in recipes
+                   if recipe.pk not in fragments]
+        if missing:
+            prefetch_related_objects(
+                missing, 'author', 'tags',
+                Prefetch('ingredient_recipes',
+                         queryset=IngredientsRecipe.objects.select_related(
+                             'ingredients')))
+            built = {recipe.pk: self.to_representation(recipe)
+                     for recipe in missing}
+            cache.set_many(
+                {keys[pk]: fragment for pk, fragment in built.items()},
+                timeout=settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+            fragments.update(built)
+        return fragments
+
+    def get_is_subscribed(self, author):
+        # Заполняется в overlay() для конкретного пользователя.
+        return False
+
+    def overlay(self, fragment, recipe):
+        fragment['author']['is_subscribed'] = recipe.author_is_subscribed
+        fragment['is_favorited'] = recipe.is_favorited
+        fragment['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+        fragment['favorites_count'] = recipe.favorites_count
+        return fragment
@@ -0,0 +1,111 @@
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+
+LIST_VERSION_KEY = 'responses:recipes:list:version'
+DETAIL_VERSION_KEY = 'responses:recipes:{pk}:version'
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Vary')
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def invalidate(pks):
+    """Сбросить все страницы списка и карточки изменённых рецептов."""
+    keys = [LIST_VERSION_KEY] + [DETAIL_VERSION_KEY.format(pk=pk)
+                                 for pk in pks]
+    get_cache().set_many(
+        {key: uuid4().hex for key in keys},
+        timeout=settings.RESPONSE_CACHE_TIMEOUT
+    )
+
+
+def get_versions(*keys):
+    """Текущие версии; недостающие создаются при первом обращении."""
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def normalize_query(query_params):
+    return '&'.join(
+        f'{name}={",".join(sorted(values))}'
+        for name, values in sorted(query_params.lists())
+    )
+
+
+class AnonymousResponseCacheMixin:
+    """Кеш готовых ответов list/retrieve для анонимных пользователей.
+
+    Для анонимных пользователей ответ зависит только от адреса сайта
+    и параметров запроса, поэтому ключом служат схема и хост,
+    нормализованная строка запроса и формат ответа. Версия списка
+    меняется при любом изменении рецептов, версия карточки — только при
+    изменении этого рецепта. Размер кеша ограничивается бэкендом
+    (``MAX_ENTRIES`` для LocMemCache). С LocMemCache сброс версий виден
+    только процессу, который обработал запись; остальные отдают старые
+    страницы до ``RESPONSE_CACHE_TIMEOUT``, поэтому при нескольких
+    процессах нужен общий бэкенд (``RESPONSE_CACHE_BACKEND``).
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            'list', [LIST_VERSION_KEY], super().list,
+            request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_response(
+            f'detail:{pk}', [DETAIL_VERSION_KEY.format(pk=pk)],
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, name, version_keys, view, request,
+                        *args, **kwargs):
+        if request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = 'responses:recipes:{}:{}'.format(
+            name,
+            hashlib.md5('|'.join([
+                *get_versions(*version_keys),
+                # В ответе абсолютные ссылки на картинки и страницы.
+                request.build_absolute_uri('/'),
+                request.accepted_media_type,
+                normalize_query(request.query_params),
+            ]).encode(), usedforsecurity=False).hexdigest()
+        )
+        cached = get_cache().get(key)
+        if cached is None:
+            self.response_cache_key = key
+            return view(request, *args, **kwargs)
+        content, headers = cached
+        response = get_conditional_response(
+            request, etag=headers.get('ETag'))
+        if not isinstance(response, HttpResponseNotModified):
+            response = HttpResponse(content)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        key = getattr(self, 'response_cache_key', None)
+        if key and response.status_code == 200:
+            response.render()
+            get_cache().set(
+                key,
+                (response.content, {header: response[header]
+                                    for header in CACHED_HEADERS
+                                    if header in response}),
+                timeout=settings.RESPONSE_CACHE_TIMEOUT
+            )
+        return response
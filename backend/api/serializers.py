@@ -1,11 +1,12 @@
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
+from rest_framework.settings import api_settings
 
 from api.fields import Base64ImageField
+from recipes.constants import BULK_RECIPES_MAX
 from recipes.models import (FavoritRecipe, Ingredient,
                             IngredientsRecipe, Recipe,
-                            ShoppingCart, TagSlug)
+                            ShoppingCart, TagSlug, delete_rows)
 from users.models import Follow, User
 
 
@@ -50,6 +51,8 @@ class UserListSerializer(serializers.ModelSerializer):
         read_only_fields = ('email',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and obj.following.filter(user=request.user).exists())
@@ -70,14 +73,15 @@ class RecipesListSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'favorites_count'
         )
 
 
 class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
     """Вспомогательный сериализатор ингредиентов для создания рецепта."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientsRecipe
@@ -87,8 +91,7 @@ class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор создания рецептов."""
 
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=TagSlug.objects.all(), many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientInRecipeCreateSerializer(
         many=True, source='ingredient_recipes')
     image = Base64ImageField()
@@ -129,6 +132,36 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 )):
             raise serializers.ValidationError(
                 "Нельзя добавить одинаковые ингредиенты")
+        return self.resolve_relations(data)
+
+    def resolve_relations(self, data):
+        """Заменить id тегов и ингредиентов объектами.
+
+        Все id загружаются одним запросом на модель; для отсутствующих
+        возвращается ошибка у соответствующего элемента.
+        """
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist']
+        tags = TagSlug.objects.in_bulk(data['tags'])
+        ingredients = Ingredient.objects.in_bulk(
+            [item['id'] for item in data['ingredient_recipes']])
+        errors = {}
+        missing_tags = [pk for pk in data['tags'] if pk not in tags]
+        if missing_tags:
+            errors['tags'] = [
+                message.format(pk_value=pk) for pk in missing_tags]
+        ingredient_errors = [
+            {} if item['id'] in ingredients
+            else {'id': [message.format(pk_value=item['id'])]}
+            for item in data['ingredient_recipes']
+        ]
+        if any(ingredient_errors):
+            errors['ingredients'] = ingredient_errors
+        if errors:
+            raise serializers.ValidationError(errors)
+        data['tags'] = [tags[pk] for pk in data['tags']]
+        for item in data['ingredient_recipes']:
+            item['id'] = ingredients[item['id']]
         return data
 
     def add_ingredients(self, ingredients, recipe):
@@ -141,28 +174,85 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ]
         IngredientsRecipe.objects.bulk_create(ingredient_list)
 
+    def set_tags(self, recipe, tags, current=()):
+        """Записать теги рецепта через промежуточную таблицу.
+
+        В отличие от ``recipe.tags.set()`` не шлёт m2m_changed: дату
+        изменения рецепта и кеши обновит его последующее сохранение.
+        """
+        through = Recipe.tags.through
+        new = {tag.pk for tag in tags}
+        current = set(current)
+        if current - new:
+            through.objects.filter(
+                recipe=recipe, tagslug_id__in=current - new).delete()
+        through.objects.bulk_create(
+            through(recipe=recipe, tagslug_id=pk) for pk in new - current)
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredient_recipes')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(
             author=self.context['request'].user, **validated_data)
-        recipe.tags.set(tags)
+        self.set_tags(recipe, tags)
         self.add_ingredients(ingredients, recipe)
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        """Привести ингредиенты рецепта к новому списку.
+
+        Меняются только отличающиеся строки: новые создаются, у оставшихся
+        обновляется количество, лишние удаляются.
+        """
+        amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            row.ingredients_id: row for row in recipe.ingredient_recipes.all()
+        }
+        to_update = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                to_update.append(row)
+        to_delete = [
+            row.pk for ingredient_id, row in existing.items()
+            if ingredient_id not in amounts
+        ]
+        if to_delete:
+            # Без сигналов post_delete, которые обновляли бы рецепт
+            # на каждую строку: его сохранит update().
+            delete_rows(IngredientsRecipe, to_delete)
+        if to_update:
+            IngredientsRecipe.objects.bulk_update(to_update, ('amount',))
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(
+                recipe=recipe, ingredients_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
+
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredient_recipes', None)
         tags = validated_data.pop('tags', None)
         if tags is not None:
-            instance.tags.set(tags)
+            self.set_tags(
+                instance, tags, [tag.pk for tag in instance.tags.all()])
         if ingredients is not None:
-            IngredientsRecipe.objects.filter(recipe=instance).delete()
-            self.add_ingredients(ingredients, instance)
+            self.update_ingredients(ingredients, instance)
+        # save() обновляет дату изменения рецепта и сбрасывает кэши,
+        # в том числе после bulk-операций, которые не вызывают сигналы.
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        # Рецепт перечитывается со всеми связями фиксированным числом
+        # запросов, а не по запросу на каждый ингредиент.
+        instance = Recipe.objects.with_related_for_user(
+            self.context['request'].user).get(pk=instance.pk)
         return RecipesListSerializer(instance, context=self.context).data
 
 
@@ -191,30 +281,29 @@ class AvatarSerializer(serializers.ModelSerializer):
 
 
 class FollowSerializer(serializers.ModelSerializer):
-    """Сериализатор подписчиков."""
+    """Сериализатор подписчиков.
+
+    Подписчик и автор передаются в save(); повторная подписка ловится
+    уникальным ограничением таблицы.
+    """
 
     class Meta:
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=['user', 'following'],
-                message='Вы уже подписаны'
-            )
-        ]
         model = Follow
         fields = ('user', 'following')
+        read_only_fields = ('user', 'following')
 
-    def validate(self, data):
-        following = data.get('following')
-        if not User.objects.filter(id=following.id).exists():
-            raise serializers.ValidationError(
-                'Пользователь, на которого вы '
-                'пытаетесь подписаться, не существует.'
-            )
-        if self.context['request'].user == following:
-            raise serializers.ValidationError(
-                'Нельзя подписываться на самого себя!')
-        return data
+    def create(self, validated_data):
+        if validated_data['user'] == validated_data['following']:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Нельзя подписываться на самого себя!']
+            })
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ['Вы уже подписаны']})
 
     def to_representation(self, instance):
         return UserSubscribesSerializer(
@@ -233,39 +322,45 @@ class UserSubscribesSerializer(UserListSerializer):
     """Сериализатор для предоставления информации о подписках пользователя."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
         fields = UserListSerializer.Meta.fields + ('recipes', 'recipes_count')
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get(
-            'recipes_limit') if request else None
-        recipes = obj.recipes.all()
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.query_params.get(
+                'recipes_limit') if request else None
+            recipes = obj.recipes.all()
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return RecipeForSubscriptionsSerializer(
             recipes, many=True, context=self.context).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
 
+class UserRecipeSerializer(serializers.ModelSerializer):
+    """Добавление рецепта в список пользователя.
 
-class FavoritRecipesSerializer(serializers.ModelSerializer):
-    """Сериализатор модели избранного."""
+    Пользователь и рецепт передаются в save(). Повтор ловится
+    уникальным ограничением таблицы, без предварительной проверки.
+    """
+    already_added_message = None
 
     class Meta:
-        model = FavoritRecipe
         fields = ('user', 'recipe')
+        read_only_fields = ('user', 'recipe')
 
-    def validate_recipe(self, recipe):
-        current_user = self.context.get('request').user
-        if FavoritRecipe.objects.filter(
-                user=current_user, recipe=recipe).exists():
-            raise serializers.ValidationError("Уже в избранном")
-        return recipe
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'recipe': [self.already_added_message]})
 
     def to_representation(self, instance):
         request = self.context.get('request')
@@ -273,21 +368,26 @@ class FavoritRecipesSerializer(serializers.ModelSerializer):
             instance.recipe, context={'request': request}).data
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class FavoritRecipesSerializer(UserRecipeSerializer):
+    """Сериализатор модели избранного."""
+    already_added_message = "Уже в избранном"
+
+    class Meta(UserRecipeSerializer.Meta):
+        model = FavoritRecipe
+
+
+class ShoppingCartSerializer(UserRecipeSerializer):
     """Сериализатор модели корзины покупок."""
+    already_added_message = "Уже в корзине"
 
-    class Meta:
+    class Meta(UserRecipeSerializer.Meta):
         model = ShoppingCart
-        fields = ('user', 'recipe')
 
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        return RecipeMinifiedSerializer(
-            instance.recipe, context={'request': request}).data
 
-    def validate_recipe(self, recipe):
-        current_user = self.context.get('request').user
-        if ShoppingCart.objects.filter(
-                user=current_user, recipe=recipe).exists():
-            raise serializers.ValidationError("Уже в корзине")
-        return recipe
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций с избранным и корзиной."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX
+    )
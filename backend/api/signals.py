@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api import catalogue, response_cache
+from api.authentication import token_cache
+from recipes.models import (Ingredient, TagSlug, ingredients_changed,
+                            recipes_changed)
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=TagSlug)
+def invalidate_tags_catalogue(**kwargs):
+    catalogue.invalidate('tags')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(ingredients_changed)
+def invalidate_ingredients_catalogue(**kwargs):
+    catalogue.invalidate('ingredients')
+
+
+@receiver(recipes_changed)
+def invalidate_recipe_responses(pks, **kwargs):
+    response_cache.invalidate(pks)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_cached_user_tokens(instance, **kwargs):
+    # Смена пароля, блокировка и правка профиля сбрасывают кэш сразу.
+    token_cache.invalidate_user(instance.pk)
@@ -0,0 +1,414 @@
+import base64
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api import catalogue
+from api.serializers import RecipesListSerializer
+
+from recipes.models import (FavoritRecipe, Ingredient, IngredientsRecipe,
+                            Recipe, ShoppingCart, TagSlug)
+from users.models import Follow, User
+
+GIF = base64.b64decode(
+    'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeReadTestCase(TestCase):
+    """Общие данные для проверок выдачи рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Анна', last_name='Иванова')
+        cls.author.avatar.save('avatar.gif', ContentFile(GIF))
+        cls.follower = User.objects.create_user(
+            username='follower', email='follower@example.com',
+            password='pass', first_name='Пётр', last_name='Петров')
+        cls.stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com',
+            password='pass', first_name='Иван', last_name='Сидоров')
+        Follow.objects.create(user=cls.follower, following=cls.author)
+        tags = [
+            TagSlug.objects.create(name='Завтрак', slug='breakfast'),
+            TagSlug.objects.create(name='Обед', slug='lunch'),
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.author if number % 2 else cls.stranger,
+                name=f'Борщ №{number}',
+                text='Варить «долго»\u2028и с душой.',
+                cooking_time=number + 1,
+                image=ContentFile(GIF, name='recipe.gif'),
+            )
+            recipe.tags.set(tags[:number % 2 + 1])
+            IngredientsRecipe.objects.bulk_create(
+                IngredientsRecipe(
+                    recipe=recipe, ingredients=ingredient,
+                    amount=number + 1)
+                for ingredient in ingredients
+            )
+            cls.recipes.append(recipe)
+        FavoritRecipe.objects.create(
+            user=cls.follower, recipe=cls.recipes[1])
+        ShoppingCart.objects.create(
+            user=cls.follower, recipe=cls.recipes[2])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        caches['responses'].clear()
+        caches['fragments'].clear()
+
+    def get_client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def get_clients(self):
+        return {
+            'anonymous': self.get_client(),
+            'follower': self.get_client(self.follower),
+            'stranger': self.get_client(self.stranger),
+        }
+
+    def get_urls(self):
+        return (
+            '/api/recipes/',
+            '/api/recipes/?limit=5&page=2',
+            f'/api/recipes/{self.recipes[1].pk}/',
+            '/api/recipes/?cursor=&limit=4',
+        )
+
+    def get_content(self, client, url, **settings):
+        caches['responses'].clear()
+        with self.settings(**settings):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.content
+
+
+class FastRenderTest(RecipeReadTestCase):
+    """Быстрая выдача совпадает с RecipesListSerializer побайтно."""
+
+    def test_same_bytes_as_serializer(self):
+        for name, client in self.get_clients().items():
+            for url in self.get_urls():
+                with self.subTest(user=name, url=url):
+                    expected = self.get_content(
+                        client, url, RECIPES_FAST_RENDER=False,
+                        RECIPE_FRAGMENT_CACHE=False)
+                    self.assertEqual(
+                        self.get_content(
+                            client, url, RECIPES_FAST_RENDER=True,
+                            RECIPE_FRAGMENT_CACHE=False),
+                        expected
+                    )
+
+    def test_fragment_overlay_same_bytes_as_serializer(self):
+        clients = self.get_clients()
+        for url in self.get_urls():
+            caches['fragments'].clear()
+            # Фрагменты, собранные для одного пользователя, читает второй.
+            for name in ('follower', 'stranger', 'follower'):
+                with self.subTest(user=name, url=url):
+                    client = clients[name]
+                    expected = self.get_content(
+                        client, url, RECIPES_FAST_RENDER=False)
+                    self.assertEqual(
+                        self.get_content(
+                            client, url, RECIPES_FAST_RENDER=True,
+                            RECIPE_FRAGMENT_CACHE=True),
+                        expected
+                    )
+
+    def test_fast_render_off_uses_serializer(self):
+        with self.settings(RECIPES_FAST_RENDER=False,
+                           RECIPE_FRAGMENT_CACHE=True):
+            response = self.get_client().get('/api/recipes/')
+        self.assertIsInstance(
+            response.renderer_context['view'].get_serializer(),
+            RecipesListSerializer)
+
+    def test_line_separators_escaped(self):
+        content = self.get_content(
+            self.get_client(), f'/api/recipes/{self.recipes[0].pk}/',
+            RECIPES_FAST_RENDER=True, RECIPE_FRAGMENT_CACHE=False)
+        self.assertIn(b'\\u2028', content)
+        self.assertNotIn('\u2028'.encode(), content)
+
+
+class RecipeQueryCountTest(RecipeReadTestCase):
+    """Число запросов к базе не зависит от размера страницы."""
+
+    def count_queries(self, client, url):
+        caches['fragments'].clear()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(client.get(url).status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant(self, client, small_url, large_url):
+        expected = self.count_queries(client, small_url)
+        caches['fragments'].clear()
+        with self.assertNumQueries(expected):
+            client.get(large_url)
+
+    def test_constant_query_count(self):
+        extra = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        IngredientsRecipe.objects.create(
+            recipe=self.recipes[1], ingredients=extra, amount=1)
+        client = self.get_client(self.follower)
+        for fast_render, fragment_cache in (
+                (False, False), (True, False), (True, True)):
+            with self.subTest(fast_render=fast_render,
+                              fragment_cache=fragment_cache), \
+                    self.settings(RECIPES_FAST_RENDER=fast_render,
+                                  RECIPE_FRAGMENT_CACHE=fragment_cache):
+                self.assert_constant(
+                    client, '/api/recipes/?limit=1', '/api/recipes/?limit=10')
+                self.assert_constant(
+                    client, f'/api/recipes/{self.recipes[0].pk}/',
+                    f'/api/recipes/{self.recipes[1].pk}/')
+
+
+class CatalogueCacheTest(TestCase):
+    """Кеш справочника видит изменения, сделанные без сигналов."""
+
+    def test_insert_without_signals_changes_version(self):
+        client = APIClient()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        response = client.get('/api/ingredients/')
+        etag = response['ETag']
+        self.assertEqual(len(response.json()), 1)
+        # Так выглядит вставка из другого процесса: сигналы здесь не придут.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Перец', measurement_unit='г')])
+        response = client.get('/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+        response = client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_survives_expiry(self):
+        client = APIClient()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        etag = client.get('/api/ingredients/')['ETag']
+        # Запись истекла, данные не менялись: ETag прежний.
+        catalogue.get_cache().delete(
+            catalogue.CATALOGUE_KEY.format(name='ingredients'))
+        response = client.get('/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class RelationDeleteTest(RecipeReadTestCase):
+    """Пакетное удаление не зависит по числу запросов от числа рецептов."""
+
+    def add_to_cart(self, client, recipes):
+        response = client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [recipe.pk for recipe in recipes]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def count_queries(self, client, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def get_cart_counts(self):
+        return list(Recipe.objects.order_by('pk').values_list(
+            'cart_count', flat=True))
+
+    def test_bulk_delete(self):
+        client = self.get_client(self.follower)
+        self.add_to_cart(client, self.recipes)
+        expected = self.count_queries(
+            client, 'delete', '/api/recipes/shopping_cart/',
+            {'recipes': [self.recipes[0].pk]})
+        self.assertEqual(
+            self.count_queries(
+                client, 'delete', '/api/recipes/shopping_cart/',
+                {'recipes': [recipe.pk for recipe in self.recipes]}),
+            expected
+        )
+        self.assertEqual(self.get_cart_counts(), [0] * len(self.recipes))
+
+    def test_bulk_add_recounts(self):
+        # Счётчик, разошедшийся с таблицей (например, из-за параллельной
+        # вставки той же пары), выравнивается по фактическому числу строк.
+        recipe = self.recipes[1]
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+        response = self.get_client(self.stranger).post(
+            reverse('api:recipes-favorite-bulk'),
+            {'recipes': [recipe.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 2)
+
+    def test_clear_shopping_cart(self):
+        client = self.get_client(self.follower)
+        self.add_to_cart(client, self.recipes[:1])
+        expected = self.count_queries(
+            client, 'delete', '/api/recipes/shopping_cart/clear/')
+        self.add_to_cart(client, self.recipes)
+        with CaptureQueriesContext(connection) as context:
+            response = client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(len(context.captured_queries), expected)
+        self.assertEqual(response.json(), {'deleted': len(self.recipes)})
+        self.assertEqual(self.get_cart_counts(), [0] * len(self.recipes))
+
+
+class RecipeUpdateTest(RecipeReadTestCase):
+    """Правка связей рецепта сохраняет сам рецепт один раз."""
+
+    def test_relations_written_without_touch(self):
+        recipe = self.recipes[1]
+        row = recipe.ingredient_recipes.first()
+        tag = TagSlug.objects.get(slug='lunch')
+        data = {
+            'ingredients': [{'id': row.ingredients_id, 'amount': 5}],
+            'tags': [tag.pk],
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_client(self.author).patch(
+                f'/api/recipes/{recipe.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        recipe_updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "recipes_recipe"')
+        ]
+        self.assertEqual(len(recipe_updates), 1, recipe_updates)
+        self.assertEqual(
+            [(item['id'], item['amount'])
+             for item in response.json()['ingredients']],
+            [(row.ingredients_id, 5)])
+        self.assertEqual(
+            [item['id'] for item in response.json()['tags']], [tag.pk])
+
+
+class ResponseCacheTest(RecipeReadTestCase):
+    """Кеш ответов анонимным пользователям различает хосты."""
+
+    @override_settings(ALLOWED_HOSTS=['evil.example', 'foodgram.example'])
+    def test_host_in_key(self):
+        client = self.get_client()
+        client.get('/api/recipes/', HTTP_HOST='evil.example')
+        response = client.get('/api/recipes/', HTTP_HOST='foodgram.example')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http://foodgram.example/media/', response.content)
+        self.assertNotIn(b'evil.example', response.content)
+
+
+class ConditionalListTest(RecipeReadTestCase):
+    """ETag списка строится по текущей странице."""
+
+    def test_cursor_page_without_aggregate(self):
+        client = self.get_client(self.stranger)
+        url = '/api/recipes/?cursor=&limit=4'
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        # Агрегатов по всей таблице рецептов нет: только строки страницы.
+        self.assertFalse([
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT COUNT(')
+        ])
+        etag = response['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        FavoritRecipe.objects.create(
+            user=self.author, recipe=self.recipes[-1])
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class KeysetPaginationTest(RecipeReadTestCase):
+    """Страницы по курсору обходят все рецепты по одному разу."""
+
+    def test_walk_with_equal_dates(self):
+        Recipe.objects.filter(pk__in=[
+            recipe.pk for recipe in self.recipes[3:9]
+        ]).update(pub_date=self.recipes[3].pub_date)
+        client = self.get_client()
+        url = '/api/recipes/?cursor=&limit=5'
+        ids = []
+        first_page = True
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                data = client.get(url).json()
+            ids.extend(recipe['id'] for recipe in data['results'])
+            if not first_page:
+                # Начало просмотра индекса — граница по первому полю.
+                self.assertTrue(any(
+                    '"pub_date" <=' in query['sql']
+                    for query in context.captured_queries))
+            first_page = False
+            url = data['next']
+        self.assertEqual(ids, list(Recipe.objects.values_list(
+            'pk', flat=True)))
+
+
+class MetricsTest(RecipeReadTestCase):
+    """Метрики потоковых ответов учитывают отдачу тела."""
+
+    def get_metric(self, name, view_name):
+        content = self.client.get('/metrics/').content.decode()
+        prefix = f'{name}_sum{{view="{view_name}"}} '
+        for line in content.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return 0
+
+    def test_streaming_response(self):
+        view_name = 'api:recipes-download-shopping-cart'
+        queries = self.get_metric('foodgram_db_queries', view_name)
+        size = self.get_metric('foodgram_response_bytes', view_name)
+        response = self.get_client(self.follower).get(
+            '/api/recipes/download_shopping_cart/')
+        content = b''.join(response.streaming_content)
+        self.assertGreater(
+            self.get_metric('foodgram_db_queries', view_name), queries)
+        self.assertEqual(
+            self.get_metric('foodgram_response_bytes', view_name),
+            size + len(content))
+
+
+class SchemaTest(TestCase):
+    """У каждой операции в схеме API свой operationId."""
+
+    def test_unique_operation_ids(self):
+        response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        operation_ids = [
+            operation['operationId']
+            for path in response.json()['paths'].values()
+            for operation in path.values()
+            if isinstance(operation, dict) and 'operationId' in operation
+        ]
+        self.assertTrue(operation_ids)
+        self.assertEqual(len(operation_ids), len(set(operation_ids)))
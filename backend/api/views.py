@@ -1,71 +1,165 @@
 import logging
 from http import HTTPStatus
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
+from drf_yasg.utils import swagger_auto_schema
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
 from rest_framework.permissions import (AllowAny,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from api.catalogue import CatalogueCacheMixin
+from api.conditional import ConditionalRecipeMixin
 from api.filters import RecipeFilter
 from api.form_text import download
-from api.pagination import RecipePagination
+from api.pagination import RecipePagination, SubscriptionPagination
 from api.permissions import IsAuthorOrReadOnly
+from api.projections import CachedRecipeProjection, RecipeProjection
+from api.renderers import ORJSONRenderer
+from api.response_cache import AnonymousResponseCacheMixin
 from api.serializers import (
     AvatarSerializer, FavoritRecipesSerializer, FollowSerializer,
-    IngredientSerializer, RecipeCreateSerializer, RecipesListSerializer,
-    ShoppingCartSerializer, TagSlugSerializer, UserSubscribesSerializer
+    IngredientSerializer, RecipeCreateSerializer, RecipeIdsSerializer,
+    RecipesListSerializer, ShoppingCartSerializer, TagSlugSerializer,
+    UserSubscribesSerializer
 )
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (FavoritRecipe,
-                            Ingredient, Recipe,
-                            ShoppingCart, TagSlug)
+                            Ingredient, IngredientsRecipe, Recipe,
+                            ShoppingCart, TagSlug, delete_rows)
 from users.models import Follow, User
 
 logger = logging.getLogger(__name__)
 
+RECIPE_COUNTERS = {
+    FavoritRecipe: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
 
-class TagSlugViewSet(mixins.RetrieveModelMixin,
+
+def recount(model, recipe_ids):
+    """Пересчитать счётчик рецептов по таблице связей одним UPDATE.
+
+    Пересчёт вместо F() ± 1 не зависит от того, какие строки добавил
+    или удалил параллельный запрос.
+    """
+    counter = RECIPE_COUNTERS[model]
+    rows = model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+        'recipe').annotate(total=Count('pk')).values('total')
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{counter: Coalesce(Subquery(rows), 0)})
+
+
+def delete_relations(queryset):
+    """Удалить связи пользователя с рецептами и пересчитать счётчики.
+
+    Один DELETE без сигналов post_delete и один UPDATE счётчиков вместо
+    выборки строк и отдельного UPDATE на каждую. Возвращает id рецептов,
+    связи с которыми были удалены.
+    """
+    with transaction.atomic():
+        rows = dict(queryset.select_for_update().values_list(
+            'pk', 'recipe_id'))
+        if rows:
+            delete_rows(queryset.model, rows)
+            recount(queryset.model, set(rows.values()))
+    return set(rows.values())
+
+
+class TagSlugViewSet(CatalogueCacheMixin, mixins.RetrieveModelMixin,
                      mixins.ListModelMixin, viewsets.GenericViewSet):
     """Вьюсет для тегов."""
+    catalogue_name = 'tags'
     queryset = TagSlug.objects.all()
     serializer_class = TagSlugSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class IngredientViewSet(mixins.RetrieveModelMixin,
+class IngredientViewSet(CatalogueCacheMixin, mixins.RetrieveModelMixin,
                         mixins.ListModelMixin, viewsets.GenericViewSet):
     """Вьюсет для ингредиентов."""
+    catalogue_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    search_fields = ('name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        return Response(ingredient_index.search(
+            name, int(limit) if limit and limit.isdigit() else None))
+
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(AnonymousResponseCacheMixin, ConditionalRecipeMixin,
+                     viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
     serializer_class = RecipesListSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     pagination_class = RecipePagination
+    keyset_ordering = ('-pub_date', '-id')
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_queryset(self):
-        return Recipe.objects.annotate_for_user(self.request.user)
+        if self.use_fragment_cache():
+            # Связи догружаются только для рецептов, которых нет в кэше.
+            return Recipe.objects.with_user_flags(self.request.user)
+        return Recipe.objects.with_related_for_user(self.request.user)
+
+    def filter_queryset(self, queryset):
+        # Фильтр нужен и для ETag, и для самой выдачи: параметры запроса
+        # (в том числе слаги тегов) разбираются один раз.
+        if not hasattr(self, '_filtered_queryset'):
+            self._filtered_queryset = super().filter_queryset(queryset)
+        return self._filtered_queryset.all()
 
     def get_serializer_class(self):
         if self.request.method in ['GET']:
             return RecipesListSerializer
         return RecipeCreateSerializer
 
+    def is_read_action(self):
+        return self.action in ('list', 'retrieve')
+
+    def use_fast_render(self):
+        return settings.RECIPES_FAST_RENDER and self.is_read_action()
+
+    def use_fragment_cache(self):
+        return settings.RECIPE_FRAGMENT_CACHE and self.use_fast_render()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.use_fragment_cache():
+            projection_class = CachedRecipeProjection
+        elif self.use_fast_render():
+            projection_class = RecipeProjection
+        else:
+            return super().get_serializer(*args, **kwargs)
+        kwargs.setdefault('context', self.get_serializer_context())
+        return projection_class(*args, **kwargs)
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.use_fast_render():
+            return [
+                ORJSONRenderer() if type(renderer) is JSONRenderer
+                else renderer for renderer in renderers
+            ]
+        return renderers
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
@@ -74,7 +168,6 @@ class RecipesViewSet(viewsets.ModelViewSet):
     @action(["get"], detail=True, url_path='get-link')
     def get_link(self, request, pk):
         """Генерация короткой ссылки."""
-        from django.conf import settings
         recipe = get_object_or_404(Recipe, pk=pk)
         short_link = recipe.short_link
         if not short_link or len(short_link) != settings.SHORT_LINK_LENGTH:
@@ -88,39 +181,109 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     @action(["post", "delete"], detail=True)
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
-            return self.add_to_model(request, FavoritRecipesSerializer, recipe)
-        return self.delete_from_model(request, FavoritRecipe, recipe)
+            return self.add_to_model(request, FavoritRecipesSerializer, pk)
+        return self.delete_from_model(request, FavoritRecipe, pk)
 
     @action(["post", "delete"], detail=True)
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
-            return self.add_to_model(request, ShoppingCartSerializer, recipe)
-        return self.delete_from_model(request, ShoppingCart, recipe)
+            return self.add_to_model(request, ShoppingCartSerializer, pk)
+        return self.delete_from_model(request, ShoppingCart, pk)
 
-    @action(["get"], detail=False)
+    # Путь совпадает с действием над одним рецептом без {id}: drf-yasg
+    # дал бы обоим одинаковые operationId.
+    @swagger_auto_schema(
+        method='post', operation_id='recipes_favorite_bulk_create')
+    @swagger_auto_schema(
+        method='delete', operation_id='recipes_favorite_bulk_delete')
+    @action(["post", "delete"], detail=False, url_path='favorite',
+            url_name='favorite-bulk', permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        """Пакетное добавление и удаление рецептов в избранном."""
+        return self.bulk_change_model(request, FavoritRecipe)
+
+    @swagger_auto_schema(
+        method='post', operation_id='recipes_shopping_cart_bulk_create')
+    @swagger_auto_schema(
+        method='delete', operation_id='recipes_shopping_cart_bulk_delete')
+    @action(["post", "delete"], detail=False, url_path='shopping_cart',
+            url_name='shopping-cart-bulk',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        """Пакетное добавление и удаление рецептов в корзине."""
+        return self.bulk_change_model(request, ShoppingCart)
+
+    @action(["delete"], detail=False, url_path='shopping_cart/clear',
+            permission_classes=[IsAuthenticated])
+    def clear_shopping_cart(self, request):
+        """Очистка корзины покупок."""
+        deleted = delete_relations(
+            ShoppingCart.objects.filter(user=request.user))
+        return Response({'deleted': len(deleted)})
+
+    @action(["get"], detail=False, permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        ingredients = 'recipe__ingredient_recipes__ingredients'
-        ingredients_amount = 'recipe__ingredient_recipes__amount'
-        shopping_cart = ShoppingCart.objects.filter(
-            user=request.user).values(ingredients_amount, ingredients)
-        return download(shopping_cart, ingredients, ingredients_amount)
-
-    def add_to_model(self, request, serializer_class, recipe):
-        serializer = serializer_class(
-            data={'user': request.user.id, 'recipe': recipe.id},
-            context={'request': request}
-        )
+        ingredients = IngredientsRecipe.objects.filter(
+            recipe__shopping_carts__user=request.user
+        ).values(
+            name=F('ingredients__name'),
+            measurement_unit=F('ingredients__measurement_unit'),
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('name')
+        return download(ingredients)
+
+    def add_to_model(self, request, serializer_class, pk):
+        recipe = get_object_or_404(Recipe, id=pk)
+        serializer = serializer_class(data={}, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer.save(user=request.user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def delete_from_model(self, request, model, recipe):
+    def bulk_change_model(self, request, model):
+        """Добавить или удалить список рецептов одним запросом к таблице.
+
+        Возвращает статус по каждому id: created/exists/not_found при
+        добавлении и deleted/absent при удалении.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        relations = model.objects.filter(user=request.user, recipe_id__in=ids)
+        if request.method == 'DELETE':
+            deleted = delete_relations(relations)
+            outcomes = {
+                pk: 'deleted' if pk in deleted else 'absent' for pk in ids}
+        else:
+            present = set(relations.values_list('recipe_id', flat=True))
+            found = set(Recipe.objects.filter(
+                pk__in=ids).values_list('pk', flat=True))
+            created = found - present
+            if created:
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        [model(user=request.user, recipe_id=pk)
+                         for pk in created],
+                        ignore_conflicts=True
+                    )
+                    # bulk_create не шлёт сигналы, а строки, вставленные
+                    # параллельно, пропускает: счётчики пересчитываются.
+                    recount(model, created)
+            outcomes = {
+                pk: 'created' if pk in created
+                else 'exists' if pk in present else 'not_found'
+                for pk in ids
+            }
+        return Response({'results': [
+            {'id': pk, 'status': outcome} for pk, outcome in outcomes.items()
+        ]})
+
+    def delete_from_model(self, request, model, pk):
         deleted, _ = model.objects.filter(
-            user=request.user, recipe=recipe).delete()
+            user=request.user, recipe_id=pk).delete()
         if not deleted:
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'errors': 'Нет такого рецепта в избранном' if model
                     == FavoritRecipe else 'Нет такого рецепта в корзине'},
@@ -133,9 +296,19 @@ class UserViewSet(DjoserUserViewSet):
     """Вьюсет пользователей."""
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        # Признак подписки считается в том же запросе, что и список;
+        # фильтрацию по HIDE_USERS по-прежнему делает djoser.
+        self.queryset = User.objects.annotate_is_subscribed(
+            self.request.user)
+        return super().get_queryset()
+
     @action(["get"], detail=False, permission_classes=[IsAuthenticated])
     def me(self, request):
-        serializer = self.get_serializer(request.user)
+        user = request.user
+        # На себя подписаться нельзя (ограничение prevent_self_follow).
+        user.is_subscribed = False
+        serializer = self.get_serializer(user)
         return Response(serializer.data)
 
     @action(["put", "delete"], detail=False,
@@ -159,9 +332,23 @@ class FollowViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     """Вьюсет подписчиков."""
     permission_classes = [AllowAny]
     serializer_class = UserSubscribesSerializer
+    pagination_class = SubscriptionPagination
+    keyset_ordering = ('username', 'id')
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        user = self.request.user
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time', 'author_id')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            # Срез внутри Prefetch Django выполняет одним запросом
+            # с ROW_NUMBER() OVER (PARTITION BY author_id).
+            recipes = recipes[:int(recipes_limit)]
+        return User.objects.annotate_is_subscribed(user).filter(
+            following__user=user
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+        ).order_by('username', 'id')
 
 
 class UserSubscribeView(APIView):
@@ -169,19 +356,18 @@ class UserSubscribeView(APIView):
 
     def post(self, request, user_id):
         author = get_object_or_404(User, id=user_id)
-        serializer = FollowSerializer(
-            data={'user': request.user.id, 'following': author.id},
-            context={'request': request}
-        )
+        serializer = FollowSerializer(data={}, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer.save(user=request.user, following=author)
+        # Подписка только что создана, проверять её запросом не нужно.
+        author.is_subscribed = True
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, user_id):
-        author = get_object_or_404(User, id=user_id)
         deleted, _ = Follow.objects.filter(
-            user=request.user, following=author).delete()
+            user=request.user, following_id=user_id).delete()
         if not deleted:
+            get_object_or_404(User, id=user_id)
             return Response(
                 {'errors': 'Вы не подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,186 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connection
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+METRICS = (
+    ('foodgram_request_seconds', 'Полное время обработки запроса.',
+     LATENCY_BUCKETS),
+    ('foodgram_db_queries', 'Количество SQL-запросов на запрос.',
+     QUERY_BUCKETS),
+    ('foodgram_db_seconds', 'Суммарное время SQL-запросов.',
+     LATENCY_BUCKETS),
+    ('foodgram_view_seconds',
+     'Время вьюхи (аутентификация, фильтры, сериализация, рендеринг) '
+     'без учёта SQL.', LATENCY_BUCKETS),
+    ('foodgram_response_bytes', 'Размер тела ответа.', SIZE_BUCKETS),
+)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Гистограммы метрик по имени вьюхи в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, view_name, values):
+        with self._lock:
+            for (name, _, buckets), value in zip(METRICS, values):
+                histogram = self._histograms.get((name, view_name))
+                if histogram is None:
+                    histogram = self._histograms[(name, view_name)] = (
+                        Histogram(buckets))
+                histogram.observe(value)
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        with self._lock:
+            for name, description, _ in METRICS:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view_name), histogram in sorted(
+                        self._histograms.items()):
+                    if metric != name:
+                        continue
+                    label = f'view="{view_name}"'
+                    cumulative = 0
+                    bounds = [*histogram.buckets, '+Inf']
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} '
+                            f'{cumulative}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(
+                        f'{name}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """Обёртка выполнения SQL: считает запросы и их время."""
+
+    def __init__(self, capture_sql):
+        self.count = 0
+        self.duration = 0
+        self.sql = [] if capture_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.sql is not None:
+                self.sql.append((elapsed, sql))
+
+
+class MetricsMiddleware:
+    """Метрики запросов по вьюхам вместо логирования всех SQL-запросов.
+
+    Для каждого запроса записываются число и время SQL-запросов, время
+    вьюхи и рендеринга без учёта SQL и размер ответа. У потоковых
+    ответов (например, выгрузки списка покупок) тело и его SQL-запросы
+    формируются при отдаче, поэтому метрики записываются, когда поток
+    прочитан до конца. Если задана доля ``METRICS_SQL_SAMPLE_RATE``,
+    у выбранных запросов сохраняется текст SQL, и медленные (дольше
+    ``METRICS_SLOW_REQUEST_MS``) пишутся в лог.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        recorder = QueryRecorder(
+            capture_sql=random.random() < settings.METRICS_SQL_SAMPLE_RATE)
+        request._metrics_view_start = None
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = self.stream(
+                request, response.streaming_content, recorder, start)
+        else:
+            self.record(request, recorder, start, (
+                0 if response.streaming else len(response.content)))
+        return response
+
+    def stream(self, request, content, recorder, start):
+        """Отдать тело потокового ответа, продолжая считать SQL и байты."""
+        size = 0
+        try:
+            with connection.execute_wrapper(recorder):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.record(request, recorder, start, size)
+
+    def record(self, request, recorder, start, size):
+        finished = time.perf_counter()
+        duration = finished - start
+        view_name = (
+            request.resolver_match.view_name
+            if request.resolver_match else 'unresolved'
+        )
+        view_start = request._metrics_view_start or start
+        registry.observe(view_name, (
+            duration,
+            recorder.count,
+            recorder.duration,
+            max(finished - view_start - recorder.duration, 0),
+            size,
+        ))
+        if (recorder.sql is not None
+                and duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS):
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.3f с, %d SQL за %.3f с\n%s',
+                request.method, request.get_full_path(), view_name,
+                duration, recorder.count, recorder.duration,
+                '\n'.join(f'{elapsed:.4f} {sql}'
+                          for elapsed, sql in recorder.sql)
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view_start = time.perf_counter()
+
+
+def metrics(request):
+    """Метрики процесса для Prometheus, доступные только локально."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise PermissionDenied
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4')
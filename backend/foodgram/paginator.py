@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки с приблизительным количеством для больших таблиц.
+
+    Для нефильтрованного списка в PostgreSQL берёт оценку числа строк из
+    статистики планировщика (pg_class.reltuples) вместо COUNT(*), если она
+    не меньше ``ADMIN_ESTIMATED_COUNT_THRESHOLD``. В остальных случаях
+    считает точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.metrics.MetricsMiddleware',
 ]
 
 AUTH_USER_MODEL = 'users.User'
@@ -129,13 +130,53 @@ MEDIA_ROOT = os.getenv('MEDIA_ROOT', '/app/media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 PAGE_SIZE = int(os.getenv('PAGE_SIZE', '6'))
 SHORT_LINK_LENGTH = int(os.getenv('SHORT_LINK_LENGTH', '6'))
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv('SHORT_LINK_CACHE_TIMEOUT', '86400'))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', '300'))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # По умолчанию кеш в памяти процесса: сброс при записи не доходит до
+    # других процессов, они отдают старые ответы до RESPONSE_CACHE_TIMEOUT.
+    # Для нескольких воркеров укажите общий бэкенд (Redis, Memcached).
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+        },
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('RECIPE_FRAGMENT_CACHE_MAX_ENTRIES', '10000')),
+        },
+    },
+}
+
+# Кеш справочников (теги, ингредиенты): одна запись на справочник.
+# Правки строк в других процессах видны не позже CATALOGUE_CACHE_TIMEOUT.
+CATALOGUE_CACHE_ALIAS = os.getenv('CATALOGUE_CACHE_ALIAS', 'default')
+CATALOGUE_CACHE_TIMEOUT = int(os.getenv('CATALOGUE_CACHE_TIMEOUT', '60'))
+
+# Кеш ответов с рецептами для анонимных пользователей
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', 'responses')
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '60'))
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': PAGE_SIZE,
@@ -165,6 +206,33 @@ SWAGGER_SETTINGS = {
     }
 }
 
+# Быстрая выдача списка и карточки рецептов (проекция + orjson)
+RECIPES_FAST_RENDER = os.getenv(
+    'RECIPES_FAST_RENDER', 'False').lower() == 'true'
+
+# Кеш представлений рецептов без признаков пользователя
+# (работает только вместе с RECIPES_FAST_RENDER)
+RECIPE_FRAGMENT_CACHE = os.getenv(
+    'RECIPE_FRAGMENT_CACHE', 'False').lower() == 'true'
+RECIPE_FRAGMENT_CACHE_ALIAS = os.getenv(
+    'RECIPE_FRAGMENT_CACHE_ALIAS', 'fragments')
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', '3600'))
+
+# Кэш токенов аутентификации в памяти процесса
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', '60'))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', '10000'))
+
+# Админка: приблизительный подсчёт строк для больших таблиц
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(
+    os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD', '100000'))
+
+# Метрики запросов
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+METRICS_SQL_SAMPLE_RATE = float(os.getenv('METRICS_SQL_SAMPLE_RATE', '0'))
+METRICS_SLOW_REQUEST_MS = int(os.getenv('METRICS_SLOW_REQUEST_MS', '500'))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -175,7 +243,16 @@ LOGGING = {
     },
     "loggers": {
         "django.db.backends": {
-            "level": "DEBUG",  # if DEBUG else 'ERROR',
+            "level": (
+                "DEBUG" if os.getenv('DEBUG_DB', 'False').lower() == 'true'
+                else "INFO"
+            ),
+            "handlers": [
+                "console",
+            ],
+        },
+        "foodgram.metrics": {
+            "level": "WARNING",
             "handlers": [
                 "console",
             ],
@@ -4,6 +4,8 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from foodgram.metrics import metrics
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Foodgram API",
@@ -19,6 +21,7 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('api/', include('api.urls')),
     path('admin/', admin.site.urls),
+    path('metrics/', metrics, name='metrics'),
     path('', include('recipes.urls')),
 ]
 
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from foodgram.paginator import EstimatedCountPaginator
 from recipes.models import (
     FavoritRecipe,
     Ingredient,
@@ -14,6 +15,9 @@ class IngredientInline(admin.TabularInline):
     model = IngredientsRecipe
     extra = 0
     min_num = 1
+    autocomplete_fields = (
+        'ingredients',
+    )
 
 
 @admin.register(TagSlug)
@@ -48,18 +52,28 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     search_fields = (
         'name',
-        'author__username',
+        '=author__username',
     )
     list_filter = (
         'tags',
     )
+    list_select_related = (
+        'author',
+    )
+    autocomplete_fields = (
+        'author',
+        'tags',
+    )
     inlines = (
         IngredientInline,
     )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    @admin.display(description="Количество в избранном")
+    @admin.display(description="Количество в избранном",
+                   ordering='favorites_count')
     def count_in_favorit(self, obj):
-        return obj.favorite_recipes.all().count()
+        return obj.favorites_count
 
 
 @admin.register(IngredientsRecipe)
@@ -73,6 +87,16 @@ class IngredientsRecipeAdmin(admin.ModelAdmin):
         'recipe__name',
         'ingredients__name',
     )
+    list_select_related = (
+        'recipe',
+        'ingredients',
+    )
+    autocomplete_fields = (
+        'recipe',
+        'ingredients',
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
@@ -82,9 +106,19 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'recipe',
     )
     search_fields = (
-        'user__username',
+        '=user__username',
         'recipe__name',
     )
+    list_select_related = (
+        'user',
+        'recipe',
+    )
+    autocomplete_fields = (
+        'user',
+        'recipe',
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(FavoritRecipe)
@@ -94,6 +128,16 @@ class FavoritRecipeAdmin(admin.ModelAdmin):
         'recipe',
     )
     search_fields = (
-        'user__username',
+        '=user__username',
         'recipe__name',
     )
+    list_select_related = (
+        'user',
+        'recipe',
+    )
+    autocomplete_fields = (
+        'user',
+        'recipe',
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
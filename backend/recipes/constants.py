@@ -4,3 +4,14 @@ TAG_SLUG_NAME_MAX_LENGTH = 32
 INGREDIENT_NAME = 128
 INGREDIENT_MASUREMENT_UNIT = 64
 RECIPE_NAME_MAX_LENGTH = 256
+SHORT_LINK_ALPHABET = (
+    '0123456789'
+    'abcdefghijklmnopqrstuvwxyz'
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+# Простое число, взаимно простое с 62: умножение по модулю 62 ** длина
+# ссылки перемешивает id без коллизий.
+SHORT_LINK_MULTIPLIER = 1580030173
+SHORT_LINK_CACHE_KEY = 'short_link:{}'
+# Максимум рецептов в одном пакетном запросе избранного/корзины.
+BULK_RECIPES_MAX = 100
@@ -0,0 +1,92 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Хранит отсортированный по названию список ингредиентов. Совпадения
+    по началу названия ищутся бинарным поиском, затем добавляются
+    совпадения по подстроке. Индекс строится при первом обращении,
+    сбрасывается сигналами при изменении ингредиентов и перестраивается
+    не реже чем раз в ``INGREDIENT_INDEX_TTL`` секунд, чтобы подхватить
+    изменения, сделанные в других процессах.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+        # Номер сброса; индекс актуален, если построен после последнего.
+        self._generation = 0
+        self._built_generation = -1
+
+    def invalidate(self):
+        """Пометить индекс устаревшим; читатели держат прежний снимок."""
+        self._generation += 1
+
+    def _is_stale(self):
+        return (
+            self._built_generation != self._generation
+            or time.monotonic() - self._built_at
+            > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _build(self):
+        from recipes.models import Ingredient
+
+        # Сброс во время чтения из базы оставит индекс устаревшим.
+        generation = self._generation
+        entries = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        )
+        index = (
+            tuple(key for key, *_ in entries),
+            tuple(
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for _, pk, name, unit in entries
+            ),
+        )
+        self._index = index
+        self._built_at = time.monotonic()
+        self._built_generation = generation
+        return index
+
+    def _snapshot(self):
+        index = self._index
+        if index is None or self._is_stale():
+            with self._lock:
+                index = self._index
+                if index is None or self._is_stale():
+                    index = self._build()
+        return index
+
+    def all(self):
+        return list(self._snapshot()[1])
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        keys, entries = self._snapshot()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = list(entries[start:end])
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for position, key in enumerate(keys):
+            if start <= position < end or query not in key:
+                continue
+            result.append(entries[position])
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+
+ingredient_index = IngredientIndex()
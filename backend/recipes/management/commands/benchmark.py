@@ -0,0 +1,138 @@
+import argparse
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, TagSlug
+from users.models import User
+
+
+def positive_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            f'ожидается целое число больше нуля, получено {value!r}')
+    return number
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет горячие эндпоинты API тестовым клиентом Django и '
+        'выводит p50/p95, пропускную способность и число SQL-запросов '
+        'в формате JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=positive_int, default=50,
+                            metavar='N')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--user', help='Email пользователя для запросов.')
+        parser.add_argument('--output', help='Файл для результата.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+        results = {
+            name: self.measure(
+                client, url, options['iterations'], options['warmup'])
+            for name, url in self.get_endpoints(user).items()
+        }
+        report = json.dumps({
+            'created_at': timezone.now().isoformat(),
+            'iterations': options['iterations'],
+            'recipes': Recipe.objects.count(),
+            'users': User.objects.count(),
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        self.stdout.write(report)
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            # Пользователь с наибольшим числом подписок — худший случай.
+            user = User.objects.annotate(
+                follows=Count('follower')).order_by('-follows').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей: сначала выполните generate_data.')
+        return user
+
+    def get_endpoints(self, user):
+        recipe = Recipe.objects.order_by('?').first()
+        tags = '&'.join(
+            f'tags={slug}' for slug in
+            TagSlug.objects.values_list('slug', flat=True)[:2])
+        ingredient = Ingredient.objects.order_by('?').first()
+        last_page = max(Recipe.objects.count() // settings.PAGE_SIZE, 1)
+        endpoints = {
+            'recipes_list': '/api/recipes/',
+            'recipes_list_filtered': f'/api/recipes/?{tags}&limit=20',
+            'recipes_list_deep_page': f'/api/recipes/?page={last_page}',
+            'subscriptions': '/api/users/subscriptions/?recipes_limit=3',
+            'download_shopping_cart': '/api/recipes/download_shopping_cart/',
+        }
+        if recipe:
+            endpoints['recipes_list_by_author'] = (
+                f'/api/recipes/?author={recipe.author_id}')
+            endpoints['recipe_detail'] = f'/api/recipes/{recipe.pk}/'
+        if ingredient:
+            endpoints['ingredient_search'] = (
+                f'/api/ingredients/?name={ingredient.name[:2]}')
+        return endpoints
+
+    def measure(self, client, url, iterations, warmup):
+        for _ in range(warmup):
+            self.request(client, url)
+        latencies = []
+        queries = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.perf_counter()
+                status = self.request(client, url)
+                latencies.append(time.perf_counter() - request_started)
+            queries.append(len(context.captured_queries))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p95_ms': round(
+                latencies[math.ceil(len(latencies) * 0.95) - 1] * 1000, 3),
+            'throughput_rps': round(iterations / elapsed, 2),
+            'queries': max(queries),
+        }
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        # Ответ с ошибкой отдаётся быстрее и без запросов к базе:
+        # такой замер выглядел бы правдоподобно, но ничего не измерял.
+        if response.status_code != 200:
+            raise CommandError(
+                f'{url} вернул статус {response.status_code}, '
+                'замер прерван. Проверьте ALLOWED_HOSTS и данные.')
+        return response.status_code
@@ -0,0 +1,77 @@
+import gzip
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from tqdm import tqdm
+
+from recipes.models import IngredientsRecipe, Recipe
+
+
+def serialize(recipe):
+    author = recipe.author
+    return {
+        'author': {
+            'email': author.email,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+        },
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': recipe.image.name,
+        'pub_date': recipe.pub_date.isoformat(),
+        'tags': [{'name': tag.name, 'slug': tag.slug}
+                 for tag in recipe.tags.all()],
+        'ingredients': [
+            {
+                'name': item.ingredients.name,
+                'measurement_unit': item.ingredients.measurement_unit,
+                'amount': item.amount,
+            } for item in recipe.ingredient_recipes.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка рецептов в NDJSON (по рецепту на строку) '
+        'с авторами, тегами, ингредиентами и путями к картинкам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки (.gz — со сжатием), по умолчанию stdout.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            self.export(sys.stdout, options['batch_size'])
+        elif path.endswith('.gz'):
+            with gzip.open(path, 'wt', encoding='utf-8') as file:
+                self.export(file, options['batch_size'])
+        else:
+            with open(path, 'w', encoding='utf-8') as file:
+                self.export(file, options['batch_size'])
+
+    def export(self, file, batch_size):
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_recipes',
+                queryset=IngredientsRecipe.objects.select_related(
+                    'ingredients')
+            ),
+        ).order_by('pk')
+        count = 0
+        for recipe in tqdm(recipes.iterator(chunk_size=batch_size),
+                           desc='Выгрузка рецептов'):
+            file.write(json.dumps(serialize(recipe), ensure_ascii=False))
+            file.write('\n')
+            count += 1
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count}'))
@@ -0,0 +1,194 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from tqdm import tqdm
+
+from recipes.models import (FavoritRecipe, Ingredient, IngredientsRecipe,
+                            Recipe, ShoppingCart, TagSlug, encode_short_link)
+from users.models import Follow, User
+
+PLACEHOLDER_IMAGE = 'recipes_img/images/generated.gif'
+PLACEHOLDER_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04'
+    b'\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D'
+    b'\x01\x00;'
+)
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Выпечка', 'bakery'),
+)
+WORDS = (
+    'Суп', 'Салат', 'Пирог', 'Каша', 'Рагу', 'Запеканка', 'Омлет',
+    'Паста', 'Плов', 'Блины', 'с курицей', 'с грибами', 'по-домашнему',
+    'овощной', 'сырный', 'быстрый', 'летний', 'острый',
+)
+
+
+def zipf_weights(size, exponent=1.1):
+    """Накопленные веса «популярности»: немногим элементам достаётся
+    большая часть выборок."""
+    return list(accumulate(1 / (rank ** exponent)
+                           for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетический набор данных: пользователей, рецепты, '
+        'подписки, избранное и списки покупок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Среднее число избранных на пользователя.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните команду import.')
+        tag_ids = self.get_tag_ids()
+        if not default_storage.exists(PLACEHOLDER_IMAGE):
+            default_storage.save(
+                PLACEHOLDER_IMAGE, ContentFile(PLACEHOLDER_GIF))
+        user_ids = self.create_users(options['users'])
+        recipe_ids = self.create_recipes(
+            options['recipes'], user_ids, tag_ids, ingredient_ids)
+        self.create_relations(
+            Follow, 'following_id', options['follows'], user_ids, user_ids)
+        self.create_relations(
+            FavoritRecipe, 'recipe_id', options['favorites'],
+            user_ids, recipe_ids)
+        self.create_relations(
+            ShoppingCart, 'recipe_id', options['cart'], user_ids, recipe_ids)
+        # bulk_create не вызывает сигналы, поэтому счётчики и поисковые
+        # документы пересчитываются целиком.
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_search', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}'))
+
+    def get_tag_ids(self):
+        if not TagSlug.objects.exists():
+            TagSlug.objects.bulk_create(
+                TagSlug(name=name, slug=slug) for name, slug in DEFAULT_TAGS)
+        return list(TagSlug.objects.values_list('id', flat=True))
+
+    def batches(self, total, desc):
+        for start in tqdm(range(0, total, self.batch_size), desc=desc):
+            yield range(start, min(start + self.batch_size, total))
+
+    def create_users(self, total):
+        password = make_password('generated-password')
+        prefix = timezone.now().strftime('%Y%m%d%H%M%S')
+        user_ids = []
+        for batch in self.batches(total, 'Пользователи'):
+            users = User.objects.bulk_create(
+                User(
+                    username=f'gen{prefix}_{number}',
+                    email=f'gen{prefix}_{number}@example.com',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                    password=password,
+                ) for number in batch
+            )
+            user_ids.extend(user.pk for user in users)
+        return user_ids
+
+    def create_recipes(self, total, user_ids, tag_ids, ingredient_ids):
+        author_weights = zipf_weights(len(user_ids))
+        ingredient_weights = zipf_weights(len(ingredient_ids), 0.8)
+        now = timezone.now()
+        TagThrough = Recipe.tags.through
+        recipe_ids = []
+        for batch in self.batches(total, 'Рецепты'):
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author_id=author_id,
+                        name=' '.join(self.random.sample(WORDS, 2)),
+                        text='Сгенерированный рецепт. ' * 10,
+                        cooking_time=self.random.randint(5, 180),
+                        image=PLACEHOLDER_IMAGE,
+                    ) for author_id in self.random.choices(
+                        user_ids, cum_weights=author_weights, k=len(batch))
+                )
+                tags = []
+                ingredients = []
+                for recipe in recipes:
+                    recipe.pub_date = recipe.updated_at = now - timedelta(
+                        minutes=self.random.randint(0, 365 * 24 * 60))
+                    recipe.short_link = encode_short_link(recipe.pk)
+                    tags.extend(
+                        TagThrough(recipe_id=recipe.pk, tagslug_id=tag_id)
+                        for tag_id in self.random.sample(
+                            tag_ids, self.random.randint(
+                                1, min(3, len(tag_ids))))
+                    )
+                    count = min(
+                        max(int(self.random.gauss(8, 3)), 1),
+                        len(ingredient_ids))
+                    ingredients.extend(
+                        IngredientsRecipe(
+                            recipe_id=recipe.pk,
+                            ingredients_id=ingredient_id,
+                            amount=self.random.randint(1, 500),
+                        ) for ingredient_id in self.sample_weighted(
+                            ingredient_ids, ingredient_weights, count)
+                    )
+                Recipe.objects.bulk_update(
+                    recipes, ('pub_date', 'updated_at', 'short_link'))
+                TagThrough.objects.bulk_create(tags)
+                IngredientsRecipe.objects.bulk_create(ingredients)
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+        return recipe_ids
+
+    def sample_weighted(self, population, cum_weights, count):
+        """Выборка без повторов с учётом весов."""
+        result = set()
+        while len(result) < count:
+            result.update(self.random.choices(
+                population, cum_weights=cum_weights, k=count - len(result)))
+        return result
+
+    def create_relations(self, model, target_field, average, user_ids,
+                         target_ids):
+        if not average or not target_ids:
+            return
+        target_weights = zipf_weights(len(target_ids))
+        for batch in self.batches(len(user_ids), model._meta.verbose_name):
+            rows = []
+            for position in batch:
+                user_id = user_ids[position]
+                count = min(
+                    int(self.random.expovariate(1 / average)),
+                    len(target_ids) // 2)
+                targets = self.sample_weighted(
+                    target_ids, target_weights, count)
+                rows.extend(
+                    model(user_id=user_id, **{target_field: target_id})
+                    for target_id in targets
+                    if not (model is Follow and target_id == user_id)
+                )
+            model.objects.bulk_create(rows, ignore_conflicts=True)
@@ -1,21 +1,190 @@
 import csv
+import gzip
+import json
+import time
+from pathlib import Path
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from tqdm import tqdm
 
-from recipes.models import Ingredient
+from recipes.models import Ingredient, Recipe, ingredients_changed
+
+FIELDS = ('name', 'measurement_unit')
+FORMATS = ('csv', 'json', 'jsonl')
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def open_source(path):
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def detect_format(path):
+    suffixes = [suffix for suffix in path.suffixes if suffix != '.gz']
+    extension = suffixes[-1].lstrip('.') if suffixes else ''
+    if extension == 'ndjson':
+        return 'jsonl'
+    if extension not in FORMATS:
+        raise CommandError(
+            f'Не удалось определить формат файла {path}, укажите --format.')
+    return extension
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2 and tuple(row[:2]) != FIELDS:
+            yield row[0], row[1]
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            item = json.loads(line)
+            yield item['name'], item['measurement_unit']
+
+
+def read_json(file):
+    """Потоковое чтение JSON-массива объектов без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise CommandError('Ожидается JSON-массив ингредиентов.')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                if buffer[position:].strip():
+                    raise CommandError('Некорректный JSON в конце файла.')
+                return
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_jsonl}
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        file_path = settings.BASE_DIR / 'data/ingredients.csv'
-        ingredients = []
-        with open(file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(
-                csvfile, fieldnames=('name', 'measurement_unit'))
-            for row in tqdm(reader, desc="Importing ingredients"):
-                ingredients.append(Ingredient(**row))
-        Ingredient.objects.bulk_create(ingredients, ignore_conflicts=True)
+    help = (
+        'Потоковый импорт ингредиентов из CSV, JSON или JSON Lines '
+        '(в том числе .gz) пачками. Ингредиенты сопоставляются по паре '
+        '(название, единица измерения): новые добавляются, совпадающие '
+        'пропускаются. С --update-units у ингредиента, который есть в '
+        'таблице в единственном варианте, заменяется единица измерения, '
+        'если в файле для этого названия указана ровно одна единица.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=settings.BASE_DIR / 'data/ingredients.csv')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать отличия от текущей таблицы без записи в БД.')
+        parser.add_argument(
+            '--update-units', action='store_true',
+            help='Заменять единицу измерения у существующих ингредиентов.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        reader = READERS[options['format'] or detect_format(path)]
+        self.dry_run = options['dry_run']
+        self.single_units = (
+            self.collect_single_units(path, reader)
+            if options['update_units'] else {})
+        self.counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        started = time.perf_counter()
+        with open_source(path) as file:
+            rows = tqdm(reader(file), desc='Импорт ингредиентов')
+            for batch in batched(rows, options['batch_size']):
+                self.import_batch(batch)
+        elapsed = time.perf_counter() - started
+        total = sum(self.counts.values())
+        if not self.dry_run and (
+                self.counts['inserted'] or self.counts['updated']):
+            ingredients_changed.send(sender=Ingredient)
         self.stdout.write(self.style.SUCCESS(
-            'Успешно импортированные ингредиенты'))
+            '{}Добавлено: {inserted}, обновлено: {updated}, '
+            'пропущено: {skipped}. {rate:.0f} строк/с'.format(
+                'Пробный запуск. ' if self.dry_run else '',
+                rate=total / elapsed if elapsed else total,
+                **self.counts
+            )
+        ))
+
+    def collect_single_units(self, path, reader):
+        """Названия, для которых в файле указана ровно одна единица."""
+        units = {}
+        with open_source(path) as file:
+            for name, unit in reader(file):
+                units.setdefault(name.strip(), set()).add(unit.strip())
+        return {name: next(iter(values))
+                for name, values in units.items() if len(values) == 1}
+
+    def import_batch(self, batch):
+        rows = dict.fromkeys(
+            (name.strip(), unit.strip()) for name, unit in batch)
+        self.counts['skipped'] += len(batch) - len(rows)
+        existing = {}
+        for ingredient in Ingredient.objects.filter(
+                name__in={name for name, _ in rows}):
+            existing.setdefault(ingredient.name, []).append(ingredient)
+        to_create = []
+        to_update = []
+        for name, unit in rows:
+            ingredients = existing.get(name, [])
+            if any(item.measurement_unit == unit for item in ingredients):
+                self.counts['skipped'] += 1
+            elif len(ingredients) == 1 and self.single_units.get(name) == unit:
+                if self.dry_run:
+                    self.stdout.write(
+                        f'~ {name}: {ingredients[0].measurement_unit} '
+                        f'-> {unit}')
+                ingredients[0].measurement_unit = unit
+                to_update.append(ingredients[0])
+            else:
+                to_create.append(
+                    Ingredient(name=name, measurement_unit=unit))
+        self.counts['inserted'] += len(to_create)
+        self.counts['updated'] += len(to_update)
+        if self.dry_run:
+            for ingredient in to_create:
+                self.stdout.write(
+                    f'+ {ingredient.name}: {ingredient.measurement_unit}')
+            return
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(to_create)
+            Ingredient.objects.bulk_update(to_update, ('measurement_unit',))
+            if to_update:
+                Recipe.touch(ingredients__in=to_update)
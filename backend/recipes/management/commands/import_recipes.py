@@ -0,0 +1,152 @@
+import gzip
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from tqdm import tqdm
+
+from recipes.models import (Ingredient, IngredientsRecipe, Recipe, TagSlug,
+                            encode_short_link, ingredients_changed,
+                            recipes_changed)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая загрузка рецептов из NDJSON, выгруженного '
+        'export_recipes. Недостающие авторы, теги и ингредиенты создаются. '
+        'Файлы картинок не копируются: переносятся только пути к ним.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON (.gz — сжатый).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        opener = gzip.open if path.endswith('.gz') else open
+        self.counts = {'imported': 0, 'skipped': 0}
+        self.tags = dict(TagSlug.objects.values_list('slug', 'id'))
+        self.new_ingredients = False
+        started = time.perf_counter()
+        try:
+            file = opener(path, 'rt', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            batch = []
+            for line in tqdm(file, desc='Загрузка рецептов'):
+                if not line.strip():
+                    continue
+                batch.append(json.loads(line))
+                if len(batch) == options['batch_size']:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+        # bulk_create не вызывает сигналы, поэтому счётчики и поисковые
+        # документы пересчитываются целиком.
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_search', stdout=self.stdout)
+        if self.new_ingredients:
+            ingredients_changed.send(sender=Ingredient)
+        recipes_changed.send(sender=Recipe, pks=[])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено рецептов: {imported}, пропущено: {skipped}. '
+            '{rate:.0f} рецептов/с'.format(
+                rate=self.counts['imported'] / elapsed if elapsed else 0,
+                **self.counts
+            )
+        ))
+
+    def get_authors(self, batch):
+        authors = {item['author']['email']: item['author'] for item in batch}
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(**author, password=password)
+             for author in authors.values()),
+            ignore_conflicts=True
+        )
+        return dict(User.objects.filter(
+            email__in=authors).values_list('email', 'id'))
+
+    def get_tags(self, batch):
+        for item in batch:
+            for tag in item['tags']:
+                if tag['slug'] not in self.tags:
+                    self.tags[tag['slug']] = TagSlug.objects.get_or_create(
+                        slug=tag['slug'], defaults={'name': tag['name']}
+                    )[0].id
+        return self.tags
+
+    def get_ingredients(self, batch):
+        keys = {
+            (item['name'], item['measurement_unit'])
+            for recipe in batch for item in recipe['ingredients']
+        }
+        ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.filter(
+                name__in={name for name, _ in keys}
+            ).values_list('id', 'name', 'measurement_unit')
+            if (name, unit) in keys
+        }
+        missing = keys - ingredients.keys()
+        if missing:
+            self.new_ingredients = True
+            for ingredient in Ingredient.objects.bulk_create(
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in missing):
+                ingredients[
+                    ingredient.name, ingredient.measurement_unit
+                ] = ingredient.pk
+        return ingredients
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        authors = self.get_authors(batch)
+        tags = self.get_tags(batch)
+        ingredients = self.get_ingredients(batch)
+        items = [
+            item for item in batch if item['author']['email'] in authors]
+        self.counts['skipped'] += len(batch) - len(items)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author_id=authors[item['author']['email']],
+                name=item['name'],
+                text=item['text'],
+                cooking_time=item['cooking_time'],
+                image=item['image'],
+            ) for item in items
+        )
+        TagThrough = Recipe.tags.through
+        tag_rows = []
+        ingredient_rows = []
+        for recipe, item in zip(recipes, items):
+            recipe.pub_date = parse_datetime(item['pub_date'])
+            recipe.updated_at = recipe.pub_date
+            recipe.short_link = encode_short_link(recipe.pk)
+            tag_rows.extend(
+                TagThrough(recipe_id=recipe.pk, tagslug_id=tags[tag['slug']])
+                for tag in item['tags']
+            )
+            ingredient_rows.extend(
+                IngredientsRecipe(
+                    recipe_id=recipe.pk,
+                    ingredients_id=ingredients[
+                        ingredient['name'], ingredient['measurement_unit']],
+                    amount=ingredient['amount'],
+                ) for ingredient in item['ingredients']
+            )
+        Recipe.objects.bulk_update(
+            recipes, ('pub_date', 'updated_at', 'short_link'))
+        TagThrough.objects.bulk_create(tag_rows)
+        IngredientsRecipe.objects.bulk_create(ingredient_rows)
+        self.counts['imported'] += len(recipes)
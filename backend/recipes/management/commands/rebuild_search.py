@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает поисковые документы всех рецептов. Нужна после '
+        'массовой загрузки через bulk_create, которая не вызывает сигналы.'
+    )
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoritRecipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+def count(model, field):
+    """Подзапрос с количеством связанных строк для внешней записи."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total')
+        ),
+        Value(0)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики: избранное и списки '
+        'покупок у рецептов, рецепты и подписчиков у пользователей. '
+        'Обновление идёт диапазонами id, чтобы не держать долгих блокировок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        updated = self.recount(Recipe, options['batch_size'], {
+            'favorites_count': count(FavoritRecipe, 'recipe'),
+            'cart_count': count(ShoppingCart, 'recipe'),
+        })
+        self.stdout.write(f'Рецептов пересчитано: {updated}')
+        updated = self.recount(User, options['batch_size'], {
+            'recipes_count': count(Recipe, 'author'),
+            'followers_count': count(Follow, 'following'),
+        })
+        self.stdout.write(f'Пользователей пересчитано: {updated}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
+
+    def recount(self, model, batch_size, counters):
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        updated = 0
+        for start in range(0, last_pk + 1, batch_size):
+            updated += model.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size).update(**counters)
+        return updated
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.16 on 2026-10-18 04:31
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total')
+        ),
+        Value(0)
+    )
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставить по одной записи на пару пользователь-рецепт."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    counters = {}
+    for model_name, field in (('FavoritRecipe', 'favorites_count'),
+                              ('ShoppingCart', 'cart_count')):
+        model = apps.get_model('recipes', model_name)
+        first = model.objects.order_by().values('user', 'recipe').annotate(
+            first=Min('pk')).values('first')
+        if model.objects.exclude(pk__in=first).delete()[0]:
+            counters[field] = count(model, 'recipe')
+    if counters:
+        Recipe.objects.update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favoritrecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favoritrecipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shoppingcart'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# SQL зафиксирован в миграции, а не берётся из recipes.search: модуль
+# может меняться, а уже применённая миграция — нет.
+SEARCH_TABLE = 'recipes_recipe_search'
+
+POSTGRES_CREATE = (
+    f'CREATE TABLE {SEARCH_TABLE} ('
+    'recipe_id integer PRIMARY KEY, document tsvector NOT NULL)',
+    f'CREATE INDEX {SEARCH_TABLE}_document_idx '
+    f'ON {SEARCH_TABLE} USING gin (document)',
+    f"""
+    INSERT INTO {SEARCH_TABLE} (recipe_id, document)
+    SELECT r.id,
+        setweight(to_tsvector('russian', r.name), 'A')
+        || setweight(to_tsvector(
+            'russian', coalesce(string_agg(i.name, ' '), '')), 'B')
+        || setweight(to_tsvector('russian', r.text), 'C')
+    FROM recipes_recipe r
+    LEFT JOIN recipes_ingredientsrecipe ir ON ir.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ir.ingredients_id
+    GROUP BY r.id
+    """,
+)
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE {SEARCH_TABLE} '
+    'USING fts5(name, ingredients, text, tokenize = "unicode61")',
+    f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text)
+    SELECT r.id, r.name, coalesce(group_concat(i.name, ' '), ''), r.text
+    FROM recipes_recipe r
+    LEFT JOIN recipes_ingredientsrecipe ir ON ir.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ir.ingredients_id
+    GROUP BY r.id
+    """,
+)
+CREATE = {'postgresql': POSTGRES_CREATE, 'sqlite': SQLITE_CREATE}
+
+
+def create_search_table(apps, schema_editor):
+    for statement in CREATE.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_relation_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'recipes_recipe_search'
+
+
+def alter_key_type(column_type):
+    def alter(apps, schema_editor):
+        # В SQLite ключ поиска — rowid FTS5, он и так 64-битный.
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(
+                f'ALTER TABLE {SEARCH_TABLE} '
+                f'ALTER COLUMN recipe_id TYPE {column_type}')
+    return alter
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            alter_key_type('bigint'), alter_key_type('integer')),
+    ]
@@ -4,16 +4,63 @@ import string
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.dispatch import Signal
+from django.utils import timezone
 
 from recipes.constants import (
     AMOUNT_INGREDIENT, COOKING_TIME_MIN, INGREDIENT_MASUREMENT_UNIT,
-    INGREDIENT_NAME, RECIPE_NAME_MAX_LENGTH, TAG_SLUG_NAME_MAX_LENGTH
+    INGREDIENT_NAME, RECIPE_NAME_MAX_LENGTH, SHORT_LINK_ALPHABET,
+    SHORT_LINK_MULTIPLIER, TAG_SLUG_NAME_MAX_LENGTH
 )
+from users.models import Follow
 
 User = get_user_model()
 
+# Отправляется при любом изменении, влияющем на представление рецептов;
+# аргумент pks — список id изменённых рецептов.
+recipes_changed = Signal()
+# Отправляется после массовых изменений ингредиентов в обход save().
+ingredients_changed = Signal()
+
+DELETE_BATCH_SIZE = 500
+
+
+def delete_rows(model, pks):
+    """Удалить строки по первичным ключам без сигналов pre/post_delete.
+
+    Один DELETE на пачку ключей вместо выборки строк и обработчиков на
+    каждую. Связанные данные (счётчики, дату изменения рецепта)
+    вызывающий код обновляет сам. Возвращает число удалённых строк.
+    """
+    pks = list(pks)
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), DELETE_BATCH_SIZE):
+            batch = pks[start:start + DELETE_BATCH_SIZE]
+            cursor.execute(
+                f'DELETE FROM {quote(model._meta.db_table)} '
+                f'WHERE {quote(model._meta.pk.column)} IN '
+                f'({", ".join(["%s"] * len(batch))})',
+                batch
+            )
+            deleted += cursor.rowcount
+    return deleted
+
+
+def encode_short_link(pk):
+    """Короткая ссылка рецепта: base62 от перемешанного id."""
+    base = len(SHORT_LINK_ALPHABET)
+    value = pk * SHORT_LINK_MULTIPLIER % base ** settings.SHORT_LINK_LENGTH
+    chars = []
+    for _ in range(settings.SHORT_LINK_LENGTH):
+        value, remainder = divmod(value, base)
+        chars.append(SHORT_LINK_ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
 
 class RecipeManager(models.Manager):
     def annotate_for_user(self, user):
@@ -34,6 +81,40 @@ class RecipeManager(models.Manager):
             is_in_shopping_cart=Exists(ShoppingCart.objects.none())
         )
 
+    def with_user_flags(self, user):
+        """Рецепты только с признаками текущего пользователя.
+
+        Кроме избранного и корзины аннотирует подписку на автора — всё,
+        что отличается у разных пользователей, считается в одном запросе
+        вместе со страницей.
+        """
+        if user.is_authenticated:
+            is_subscribed = Exists(Follow.objects.filter(
+                user=user, following=OuterRef('author')))
+        else:
+            is_subscribed = Exists(Follow.objects.none())
+        return self.annotate_for_user(user).annotate(
+            author_is_subscribed=is_subscribed)
+
+    def with_related_for_user(self, user):
+        """Рецепты со всеми данными для списка и карточки рецепта.
+
+        Теги, ингредиенты и автор (с признаком подписки) загружаются
+        фиксированным числом запросов независимо от размера страницы.
+        """
+        return self.annotate_for_user(user).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_recipes',
+                queryset=IngredientsRecipe.objects.select_related(
+                    'ingredients')
+            ),
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate_is_subscribed(user)
+            ),
+        )
+
 
 class TagSlug(models.Model):
     name = models.CharField(
@@ -117,6 +198,9 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True
+    )
     short_link = models.CharField(
         max_length=settings.SHORT_LINK_LENGTH,
         unique=True,
@@ -124,14 +208,44 @@ class Recipe(models.Model):
         null=True,
         verbose_name='Короткая ссылка'
     )
+    favorites_count = models.PositiveIntegerField(
+        'Количество в избранном', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'Количество в списках покупок', default=0, editable=False
+    )
 
     objects = RecipeManager()
 
+    @classmethod
+    def touch(cls, **filters):
+        """Обновить дату изменения рецептов без вызова save()."""
+        if 'pk' in filters:
+            pks = [filters['pk']]
+        elif 'pk__in' in filters:
+            pks = list(filters['pk__in'])
+        else:
+            pks = list(cls.objects.filter(**filters).order_by().values_list(
+                'pk', flat=True).distinct())
+        if pks:
+            cls.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+            recipes_changed.send(sender=cls, pks=pks)
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
-        ordering = ("-pub_date",)
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -145,9 +259,21 @@ class Recipe(models.Model):
                 return short_link
 
     def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
         if not self.short_link:
+            self.assign_short_link()
+
+    def assign_short_link(self):
+        self.short_link = encode_short_link(self.pk)
+        try:
+            with transaction.atomic():
+                Recipe.objects.filter(pk=self.pk).update(
+                    short_link=self.short_link)
+        except IntegrityError:
+            # Код совпал со старой случайной ссылкой.
             self.short_link = self.generate_short_link()
-        super().save(*args, **kwargs)
+            Recipe.objects.filter(pk=self.pk).update(
+                short_link=self.short_link)
 
 
 class IngredientsRecipe(models.Model):
@@ -210,7 +336,7 @@ class UserRecipeBase(models.Model):
 
 
 class ShoppingCart(UserRecipeBase):
-    class Meta:
+    class Meta(UserRecipeBase.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_carts'
@@ -221,7 +347,7 @@ class ShoppingCart(UserRecipeBase):
 
 
 class FavoritRecipe(UserRecipeBase):
-    class Meta:
+    class Meta(UserRecipeBase.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
         default_related_name = 'favorite_recipes'
@@ -0,0 +1,143 @@
+"""Полнотекстовый поиск рецептов.
+
+Поисковый документ рецепта — название, ингредиенты и описание — хранится
+в отдельной таблице ``recipes_recipe_search``. В PostgreSQL это колонка
+tsvector с GIN-индексом и русской морфологией, в SQLite — виртуальная
+таблица FTS5 (без стемминга, слова запроса ищутся по префиксу).
+Таблицу создают миграции 0007 и 0008.
+"""
+import re
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'recipes_recipe_search'
+SEARCH_CONFIG = 'russian'
+SEARCH_WORD = re.compile(r'\w+')
+PENDING_ATTRIBUTE = 'recipe_search_pending'
+
+POSTGRES_INSERT = f"""
+    INSERT INTO {SEARCH_TABLE} (recipe_id, document)
+    SELECT r.id,
+        setweight(to_tsvector('{SEARCH_CONFIG}', r.name), 'A')
+        || setweight(to_tsvector(
+            '{SEARCH_CONFIG}', coalesce(string_agg(i.name, ' '), '')), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', r.text), 'C')
+    FROM recipes_recipe r
+    LEFT JOIN recipes_ingredientsrecipe ir ON ir.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ir.ingredients_id
+    {{where}}
+    GROUP BY r.id
+"""
+POSTGRES_MATCH = (
+    f"document @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)")
+POSTGRES_RANK = (
+    f"SELECT ts_rank(document, websearch_to_tsquery('{SEARCH_CONFIG}', %s)) "
+    f'FROM {SEARCH_TABLE} WHERE recipe_id = recipes_recipe.id'
+)
+
+SQLITE_INSERT = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text)
+    SELECT r.id, r.name, coalesce(group_concat(i.name, ' '), ''), r.text
+    FROM recipes_recipe r
+    LEFT JOIN recipes_ingredientsrecipe ir ON ir.recipe_id = r.id
+    LEFT JOIN recipes_ingredient i ON i.id = ir.ingredients_id
+    {{where}}
+    GROUP BY r.id
+"""
+SQLITE_MATCH = f'{SEARCH_TABLE} MATCH %s'
+# Веса колонок bm25 повторяют веса A/B/C PostgreSQL; меньше — лучше.
+SQLITE_RANK = (
+    f'SELECT -bm25({SEARCH_TABLE}, 10.0, 4.0, 1.0) FROM {SEARCH_TABLE} '
+    f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = recipes_recipe.id'
+)
+
+
+def get_key_column(vendor):
+    return 'recipe_id' if vendor == 'postgresql' else 'rowid'
+
+
+def rebuild(using=connection):
+    """Пересобрать поисковые документы всех рецептов."""
+    insert = get_insert(using.vendor)
+    if insert is None:
+        return
+    with using.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(insert.format(where=''))
+
+
+def update(pks, using=connection):
+    """Обновить документы рецептов; удалённые рецепты убираются из поиска."""
+    insert = get_insert(using.vendor)
+    if insert is None or not pks:
+        return
+    pks = [int(pk) for pk in pks]
+    placeholders = ', '.join(['%s'] * len(pks))
+    key = get_key_column(using.vendor)
+    with using.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({placeholders})',
+            pks)
+        cursor.execute(
+            insert.format(where=f'WHERE r.id IN ({placeholders})'), pks)
+
+
+def schedule_update(pks, using=connection):
+    """Обновить документы после фиксации транзакции.
+
+    Рецепт, его теги и ингредиенты пишутся разными запросами, поэтому
+    документ собирается, когда все они уже сохранены. Рецепты копятся
+    в одном наборе на соединение, и первый сработавший колбэк
+    пересобирает их все одним запросом, остальные ничего не делают.
+    Колбэк регистрируется на каждый вызов, чтобы откат точки сохранения
+    не оставил набор без обработчика.
+    """
+    pending = getattr(using, PENDING_ATTRIBUTE, None)
+    if pending is None:
+        pending = set()
+        setattr(using, PENDING_ATTRIBUTE, pending)
+    pending.update(pks)
+    transaction.on_commit(
+        partial(update_pending, using), using=using.alias)
+
+
+def update_pending(using=connection):
+    """Пересобрать документы, накопленные schedule_update."""
+    pks = getattr(using, PENDING_ATTRIBUTE, None)
+    if pks:
+        setattr(using, PENDING_ATTRIBUTE, set())
+        update(pks, using)
+
+
+def get_insert(vendor):
+    return {'postgresql': POSTGRES_INSERT, 'sqlite': SQLITE_INSERT}.get(vendor)
+
+
+def to_fts5_query(query):
+    """Запрос FTS5: все слова, каждое — по префиксу."""
+    return ' '.join(
+        '"{}"*'.format(word) for word in SEARCH_WORD.findall(query))
+
+
+def search(queryset, query):
+    """Отфильтровать рецепты по запросу и упорядочить по релевантности."""
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        match, rank = POSTGRES_MATCH, POSTGRES_RANK
+    elif vendor == 'sqlite':
+        match, rank = SQLITE_MATCH, SQLITE_RANK
+        query = to_fts5_query(query)
+    else:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query))
+    if not query:
+        return queryset.none()
+    key = get_key_column(vendor)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT {key} FROM {SEARCH_TABLE} WHERE {match}', [query]
+    )).annotate(
+        search_rank=RawSQL(rank, [query])
+    ).order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes import search
+from recipes.constants import SHORT_LINK_CACHE_KEY
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (FavoritRecipe, Ingredient, IngredientsRecipe,
+                            Recipe, ShoppingCart, TagSlug,
+                            ingredients_changed, recipes_changed)
+from users.models import Follow
+
+User = get_user_model()
+
+# Сохранения пользователя, которые не меняют его представление в рецептах.
+USER_SERVICE_FIELDS = frozenset(('last_login', 'password'))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(ingredients_changed)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_short_link(instance, **kwargs):
+    if instance.short_link:
+        cache.delete(SHORT_LINK_CACHE_KEY.format(instance.short_link))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def notify_recipe_changed(instance, **kwargs):
+    recipes_changed.send(sender=Recipe, pks=[instance.pk])
+
+
+@receiver(recipes_changed)
+def update_search_documents(pks, **kwargs):
+    search.schedule_update(pks)
+
+
+@receiver((post_save, post_delete), sender=IngredientsRecipe)
+def touch_recipe_on_ingredient_change(instance, **kwargs):
+    Recipe.touch(pk=instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_on_tags_change(instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Recipe.touch(pk=instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        Recipe.touch(pk__in=pk_set)
+    elif action == 'pre_clear':
+        Recipe.touch(tags=instance)
+
+
+@receiver(post_save, sender=TagSlug)
+@receiver(pre_delete, sender=TagSlug)
+def touch_recipes_on_tag_change(instance, **kwargs):
+    Recipe.touch(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_on_ingredient_rename(instance, created, **kwargs):
+    if not created:
+        Recipe.touch(ingredients=instance)
+
+
+@receiver(post_save, sender=User)
+def touch_recipes_on_author_change(instance, created, update_fields,
+                                   **kwargs):
+    if created or (update_fields and USER_SERVICE_FIELDS.issuperset(
+            update_fields)):
+        return
+    Recipe.touch(author=instance)
+
+
+def change_counter(model, pk, field, signal, created=False):
+    """Атомарно изменить счётчик: +1 при создании строки, -1 при удалении."""
+    if signal is post_delete:
+        delta = -1
+    elif created:
+        delta = 1
+    else:
+        return
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+@receiver((post_save, post_delete), sender=FavoritRecipe)
+def update_favorites_count(signal, instance, created=False, **kwargs):
+    change_counter(
+        Recipe, instance.recipe_id, 'favorites_count', signal, created)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def update_cart_count(signal, instance, created=False, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'cart_count', signal, created)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipes_count(signal, instance, created=False, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', signal, created)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def update_followers_count(signal, instance, created=False, **kwargs):
+    change_counter(
+        User, instance.following_id, 'followers_count', signal, created)
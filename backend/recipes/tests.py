@@ -0,0 +1,122 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+
+from recipes import search
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient
+from users.models import User
+
+
+class ImportIngredientsTest(TestCase):
+    """Импорт сопоставляет ингредиенты по названию и единице измерения."""
+
+    def setUp(self):
+        Ingredient.objects.create(name='тестперец', measurement_unit='г')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'ingredients.csv'
+        self.path.write_text(
+            'тестсоль,г\nтестсоль,щепотка\nтестперец,шт\n', encoding='utf-8')
+
+    def get_units(self, name):
+        return set(Ingredient.objects.filter(name=name).values_list(
+            'measurement_unit', flat=True))
+
+    def test_units_are_not_rewritten_by_default(self):
+        call_command('import', str(self.path), stdout=StringIO())
+        self.assertEqual(self.get_units('тестсоль'), {'г', 'щепотка'})
+        self.assertEqual(self.get_units('тестперец'), {'г', 'шт'})
+
+    def test_update_units(self):
+        call_command(
+            'import', str(self.path), '--update-units', stdout=StringIO())
+        self.assertEqual(self.get_units('тестсоль'), {'г', 'щепотка'})
+        self.assertEqual(self.get_units('тестперец'), {'шт'})
+
+
+class SearchScheduleTest(TestCase):
+    """Документ поиска пересобирается один раз за транзакцию."""
+
+    def setUp(self):
+        # Колбэки данных других тестов не срабатывают: их откатывает TestCase.
+        setattr(connection, search.PENDING_ATTRIBUTE, set())
+
+    def test_one_update_per_transaction(self):
+        with mock.patch.object(search, 'update') as update, \
+                self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                search.schedule_update([1])
+                search.schedule_update([1, 2])
+                with transaction.atomic():
+                    search.schedule_update([3])
+        update.assert_called_once_with({1, 2, 3}, connection)
+
+    def test_rolled_back_savepoint_keeps_callback(self):
+        with mock.patch.object(search, 'update') as update, \
+                self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    search.schedule_update([1])
+                    raise ValueError
+            except ValueError:
+                pass
+            search.schedule_update([2])
+        # Лишняя пересборка рецепта из отката безвредна, потеря — нет.
+        update.assert_called_once_with({1, 2}, connection)
+
+
+class IngredientIndexTest(TestCase):
+    """Сброс индекса не ломает параллельный поиск."""
+
+    def test_invalidate_during_search(self):
+        Ingredient.objects.create(name='тестсоль', measurement_unit='г')
+        index = IngredientIndex()
+        index.search('тест')
+        is_stale = index._is_stale
+
+        def invalidate_and_check():
+            # Сброс из другого потока между проверкой и чтением индекса.
+            stale = is_stale()
+            index.invalidate()
+            return stale
+
+        with mock.patch.object(index, '_is_stale', invalidate_and_check):
+            self.assertEqual(
+                [item['name'] for item in index.search('тест')],
+                ['тестсоль'])
+        Ingredient.objects.create(name='тестперец', measurement_unit='г')
+        self.assertEqual(
+            [item['name'] for item in index.search('тест')],
+            ['тестперец', 'тестсоль'])
+
+
+class BenchmarkTest(TestCase):
+    """Замер не выдаёт отчёт по ответам с ошибкой."""
+
+    def setUp(self):
+        User.objects.create_user(
+            username='user', email='user@example.com', password='pass')
+
+    def test_report(self):
+        output = StringIO()
+        call_command(
+            'benchmark', '--iterations=2', '--warmup=0', stdout=output)
+        self.assertIn('recipes_list', output.getvalue())
+
+    @override_settings(ALLOWED_HOSTS=['wrong_host!'])
+    def test_error_status_fails(self):
+        # На недопустимый Host Django отвечает 400.
+        with self.assertRaisesMessage(CommandError, 'вернул статус 400'):
+            call_command(
+                'benchmark', '--iterations=2', '--warmup=0',
+                stdout=StringIO())
+
+    def test_iterations_validated(self):
+        with self.assertRaisesMessage(CommandError, 'больше нуля'):
+            call_command('benchmark', '--iterations=0', stdout=StringIO())
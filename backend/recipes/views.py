@@ -1,18 +1,23 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.views.decorators.http import require_GET
 
+from recipes.constants import SHORT_LINK_CACHE_KEY
 from recipes.models import Recipe
 
 
 @require_GET
 def load_url(request, short_link):
     """Перенаправление с короткой ссылки на страницу рецепта."""
-    try:
-        recipe = Recipe.objects.get(short_link=short_link)
-        return HttpResponseRedirect(
-            request.build_absolute_uri(reverse(
-                'recipes-detail', kwargs={'pk': recipe.id}))
-        )
-    except Recipe.DoesNotExist:
-        return HttpResponseRedirect('/404')
+    key = SHORT_LINK_CACHE_KEY.format(short_link)
+    path = cache.get(key)
+    if path is None:
+        recipe_id = Recipe.objects.filter(
+            short_link=short_link).values_list('id', flat=True).first()
+        if recipe_id is None:
+            return HttpResponseRedirect('/404')
+        path = reverse('api:recipes-detail', kwargs={'pk': recipe_id})
+        cache.set(key, path, settings.SHORT_LINK_CACHE_TIMEOUT)
+    return HttpResponseRedirect(request.build_absolute_uri(path))
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
 
+from foodgram.paginator import EstimatedCountPaginator
 from users.models import User, Follow
 
 
@@ -9,20 +10,28 @@ from users.models import User, Follow
 class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'count_follows', 'count_recipes')
     search_fields = ('username', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    @admin.display(description="Количество подписчиков")
+    @admin.display(description="Количество подписчиков",
+                   ordering='followers_count')
     def count_follows(self, obj):
-        return obj.follower.count()
+        return obj.followers_count
 
-    @admin.display(description="Количество рецептов")
+    @admin.display(description="Количество рецептов",
+                   ordering='recipes_count')
     def count_recipes(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'following')
-    search_fields = ('user__username', 'following__username')
+    search_fields = ('=user__username', '=following__username')
+    list_select_related = ('user', 'following')
+    autocomplete_fields = ('user', 'following')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.unregister(Group)
@@ -1,11 +1,27 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.core.validators import EmailValidator
 from django.db import models
-from django.db.models import F, Q
+from django.db.models import Exists, F, OuterRef, Q
 
 from users.constants import EMAIL_LENGTH, USER_NAME_LENGTH
 
 
+class UserManager(BaseUserManager):
+    def annotate_is_subscribed(self, user):
+        queryset = self.get_queryset()
+        if user.is_authenticated:
+            return queryset.annotate(
+                is_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=user, following=OuterRef('pk'))
+                )
+            )
+        return queryset.annotate(
+            is_subscribed=Exists(Follow.objects.none())
+        )
+
+
 class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ["username", "first_name", "last_name", "password"]
@@ -24,6 +40,14 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
+
+    objects = UserManager()
 
     class Meta:
         verbose_name = 'пользователь'